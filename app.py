@@ -5,14 +5,33 @@ Flask backend with in-memory storage, AI abstraction, and safety moderation.
 
 import os
 import re
+import json
+import heapq
+import atexit
+import base64
+import bisect
+import contextvars
+import copy
+import hashlib
 import secrets
 import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from urllib.parse import unquote
 from datetime import datetime
 from functools import wraps
-from flask import Flask, render_template, request, session, redirect, url_for, jsonify, g, flash
+from types import MappingProxyType
+from flask import Flask, render_template, request, session, redirect, url_for, jsonify, g, flash, has_request_context, copy_current_request_context
 from werkzeug.security import generate_password_hash, check_password_hash
 
+try:
+    import numpy as np
+except ImportError:  # Optional: semantic matching falls back to pure-Python scans
+    np = None
+
 app = Flask(__name__)
 # Use a stable secret key for session persistence
 app.secret_key = os.environ.get("SECRET_KEY", "sun-devil-circle-dev-key-2024")
@@ -48,6 +67,20 @@ def get_db():
     return db
 
 
+# Databases created before the profiles.revision column, and not yet migrated
+# by init_db, still load and save profiles; their revision reads as 0.
+profile_revision_columns = {}  # { DATABASE path: bool }
+
+
+def has_profile_revision(db):
+    """Whether the profiles table has the revision column (checked once per database)."""
+    present = profile_revision_columns.get(DATABASE)
+    if present is None:
+        present = any(row[1] == "revision" for row in db.execute("PRAGMA table_info(profiles)"))
+        profile_revision_columns[DATABASE] = present
+    return present
+
+
 @app.teardown_appcontext
 def close_connection(exception):
     """Close database connection."""
@@ -81,6 +114,7 @@ def init_db():
                 languages TEXT DEFAULT '',
                 cultural_background TEXT DEFAULT '',
                 onboarding_complete INTEGER DEFAULT 0,
+                revision INTEGER DEFAULT 0,
                 FOREIGN KEY (user_id) REFERENCES users(id)
             )
         ''')
@@ -117,100 +151,470 @@ def init_db():
             db.execute('ALTER TABLE profiles ADD COLUMN gender TEXT DEFAULT ""')
         except:
             pass
+        try:
+            db.execute('ALTER TABLE profiles ADD COLUMN revision INTEGER DEFAULT 0')
+        except:
+            pass
+        db.execute('CREATE INDEX IF NOT EXISTS profiles_revision ON profiles (revision)')
         db.commit()
+        profile_revision_columns.pop(DATABASE, None)
+
+
+# Process-wide cache of parsed profiles: { user_id: (version, revision, profile) },
+# LRU-bounded. Profiles are frozen (read-only mapping, lists as tuples) so a
+# single object is shared by every request. save_profile_to_db writes the new
+# profile through under its bumped version, and entries older than the
+# user's current profile version are treated as misses.
+# Profile versions are per process, so each save also stamps the row's
+# revision column with the next value of a table-wide sequence (MAX + 1);
+# load_profiles_from_db checks cached revisions against the database with
+# one batched query per request, and the inverted profile index uses
+# MAX(revision) as a watermark, so saves made by other workers are picked
+# up. PROFILE_CACHE_CHECK_DB=0 skips both checks for single-process
+# deployments.
+PROFILE_CACHE_SIZE = int(os.environ.get("PROFILE_CACHE_SIZE", "10000"))
+PROFILE_CACHE_CHECK_DB = os.environ.get("PROFILE_CACHE_CHECK_DB", "1") == "1"
+
+
+def freeze_profile(profile_dict):
+    """Return a read-only copy of a profile dict with list values as tuples."""
+    return MappingProxyType({
+        key: tuple(value) if isinstance(value, list) else value
+        for key, value in profile_dict.items()
+    })
+
+
+class ProfileCache:
+    """Bounded, versioned cache of frozen profiles keyed by user id."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id, default=None):
+        """Return the cached profile if it is current, else default."""
+        entry = self.lookup(user_id)
+        return default if entry is None else entry[1]
+
+    def lookup(self, user_id):
+        """Return (revision, profile) if the cached profile is current, else None."""
+        version = get_profile_version(user_id)
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None or entry[0] != version:
+                return None
+            self.entries.move_to_end(user_id)
+            return entry[1:]
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def __getitem__(self, user_id):
+        profile = self.get(user_id)
+        if profile is None:
+            raise KeyError(user_id)
+        return profile
+
+    def __len__(self):
+        return len(self.entries)
+
+    def put(self, user_id, profile_dict, version, revision=0, replace=False):
+        """
+        Cache profile_dict as of version (and its row's revision). Loaders
+        pass the version read before querying and never replace an entry of
+        the same or a newer version, so a read racing a save cannot clobber
+        the written-through profile; save_profile_to_db passes replace=True.
+        Returns the frozen profile.
+        """
+        profile = freeze_profile(profile_dict)
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and (entry[0] > version or (entry[0] == version and not replace)):
+                return profile
+            self.entries[user_id] = (version, revision, profile)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return profile
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_profiles = ProfileCache(PROFILE_CACHE_SIZE)
 
 
 def save_profile_to_db(user_id, profile_dict):
-    """Save profile to database or in-memory storage."""
+    """
+    Save profile to database or in-memory storage. The profile version is
+    bumped only once the new profile is stored, so a concurrent read cannot
+    cache the old profile under the new version.
+    """
+    if has_request_context():
+        g.get("profile_memo", {}).pop(user_id, None)
     if IS_VERCEL:
         # Use in-memory storage on Vercel
         memory_profiles[user_id] = profile_dict.copy()
+        bump_profile_version(user_id)
+        user_profiles.put(user_id, profile_dict, get_profile_version(user_id), replace=True)
+        if profile_index_state["loaded"]:
+            index_profile(user_id, profile_dict)
         return
     
     # Use SQLite locally
     db = get_db()
-    challenges = ','.join(profile_dict.get('primary_challenge', []))
-    support_topics = ','.join(profile_dict.get('support_topics', []))
-    private_topics = ','.join(profile_dict.get('private_topics', []))
-    languages = ','.join(profile_dict.get('languages', []))
-    cultural_background = ','.join(profile_dict.get('cultural_background', []))
-    db.execute('''
-        INSERT OR REPLACE INTO profiles 
-        (user_id, display_name, gender, preferred_language, primary_challenge, support_style, support_topics, private_topics, languages, cultural_background, onboarding_complete, graduation_year, degree_program)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        user_id,
-        profile_dict.get('display_name', ''),
-        profile_dict.get('gender', ''),
-        profile_dict.get('preferred_language', ''),
-        challenges,
-        profile_dict.get('support_style', 'mixed'),
-        support_topics,
-        private_topics,
-        languages,
-        cultural_background,
-        1 if profile_dict.get('onboarding_complete') else 0,
-        profile_dict.get('graduation_year', ''),
-        profile_dict.get('degree_program', '')
-    ))
+    row = {
+        'user_id': user_id,
+        'display_name': profile_dict.get('display_name', ''),
+        'gender': profile_dict.get('gender', ''),
+        'preferred_language': profile_dict.get('preferred_language', ''),
+        'primary_challenge': ','.join(profile_dict.get('primary_challenge', [])),
+        'support_style': profile_dict.get('support_style', 'mixed'),
+        'support_topics': ','.join(profile_dict.get('support_topics', [])),
+        'private_topics': ','.join(profile_dict.get('private_topics', [])),
+        'languages': ','.join(profile_dict.get('languages', [])),
+        'cultural_background': ','.join(profile_dict.get('cultural_background', [])),
+        'onboarding_complete': 1 if profile_dict.get('onboarding_complete') else 0,
+        'graduation_year': profile_dict.get('graduation_year', ''),
+        'degree_program': profile_dict.get('degree_program', ''),
+    }
+    revision = 0
+    if has_profile_revision(db):
+        db.execute('''
+            INSERT OR REPLACE INTO profiles 
+            (user_id, display_name, gender, preferred_language, primary_challenge, support_style, support_topics, private_topics, languages, cultural_background, onboarding_complete, graduation_year, degree_program, revision)
+            VALUES (:user_id, :display_name, :gender, :preferred_language, :primary_challenge, :support_style, :support_topics, :private_topics, :languages, :cultural_background, :onboarding_complete, :graduation_year, :degree_program,
+                    COALESCE((SELECT MAX(revision) FROM profiles), 0) + 1)
+        ''', row)
+        revision = db.execute('SELECT revision FROM profiles WHERE user_id = ?', (user_id,)).fetchone()[0]
+    else:
+        db.execute('''
+            INSERT OR REPLACE INTO profiles 
+            (user_id, display_name, gender, preferred_language, primary_challenge, support_style, support_topics, private_topics, languages, cultural_background, onboarding_complete, graduation_year, degree_program)
+            VALUES (:user_id, :display_name, :gender, :preferred_language, :primary_challenge, :support_style, :support_topics, :private_topics, :languages, :cultural_background, :onboarding_complete, :graduation_year, :degree_program)
+        ''', row)
     db.commit()
+    bump_profile_version(user_id)
+    # Write through exactly what a later load would parse back
+    user_profiles.put(user_id, profile_from_row(row), get_profile_version(user_id), revision, replace=True)
+    if profile_index_state["loaded"]:
+        index_profile(user_id, profile_dict)
+
+
+def profile_from_row(row):
+    """Parse a profiles row into a profile dict."""
+    challenges = row['primary_challenge'].split(',') if row['primary_challenge'] else []
+    # Handle new columns that might not exist in older databases
+    support_topics = []
+    private_topics = []
+    languages = []
+    cultural_background = []
+    onboarding_complete = False
+    graduation_year = ''
+    degree_program = ''
+    try:
+        support_topics = row['support_topics'].split(',') if row['support_topics'] else []
+        private_topics = row['private_topics'].split(',') if row['private_topics'] else []
+        languages = row['languages'].split(',') if row['languages'] else []
+        cultural_background = row['cultural_background'].split(',') if row['cultural_background'] else []
+        onboarding_complete = bool(row['onboarding_complete'])
+    except:
+        pass
+    try:
+        graduation_year = row['graduation_year'] or ''
+        degree_program = row['degree_program'] or ''
+    except:
+        pass
+    # Try to get gender field (may not exist in older databases)
+    gender = ''
+    try:
+        gender = row['gender'] or ''
+    except:
+        pass
+    return {
+        'display_name': row['display_name'] or '',
+        'gender': gender,
+        'preferred_language': row['preferred_language'] or '',
+        'primary_challenge': challenges,
+        'support_style': row['support_style'] or 'mixed',
+        'support_topics': support_topics,
+        'private_topics': private_topics,
+        'languages': languages,
+        'cultural_background': cultural_background,
+        'onboarding_complete': onboarding_complete,
+        'graduation_year': graduation_year,
+        'degree_program': degree_program
+    }
 
 
 def load_profile_from_db(user_id):
-    """Load profile from database or in-memory storage."""
-    if IS_VERCEL:
-        # Use in-memory storage on Vercel
-        return memory_profiles.get(user_id)
-    
-    # Use SQLite locally
-    db = get_db()
-    row = db.execute('SELECT * FROM profiles WHERE user_id = ?', (user_id,)).fetchone()
-    if row:
-        challenges = row['primary_challenge'].split(',') if row['primary_challenge'] else []
-        # Handle new columns that might not exist in older databases
-        support_topics = []
-        private_topics = []
-        languages = []
-        cultural_background = []
-        onboarding_complete = False
-        graduation_year = ''
-        degree_program = ''
-        try:
-            support_topics = row['support_topics'].split(',') if row['support_topics'] else []
-            private_topics = row['private_topics'].split(',') if row['private_topics'] else []
-            languages = row['languages'].split(',') if row['languages'] else []
-            cultural_background = row['cultural_background'].split(',') if row['cultural_background'] else []
-            onboarding_complete = bool(row['onboarding_complete'])
-        except:
-            pass
-        try:
-            graduation_year = row['graduation_year'] or ''
-            degree_program = row['degree_program'] or ''
-        except:
-            pass
-        # Try to get gender field (may not exist in older databases)
-        gender = ''
-        try:
-            gender = row['gender'] or ''
-        except:
-            pass
-        return {
-            'display_name': row['display_name'] or '',
-            'gender': gender,
-            'preferred_language': row['preferred_language'] or '',
-            'primary_challenge': challenges,
-            'support_style': row['support_style'] or 'mixed',
-            'support_topics': support_topics,
-            'private_topics': private_topics,
-            'languages': languages,
-            'cultural_background': cultural_background,
-            'onboarding_complete': onboarding_complete,
-            'graduation_year': graduation_year,
-            'degree_program': degree_program
+    """Load profile (frozen, see user_profiles) from database or in-memory storage."""
+    return load_profiles_from_db([user_id]).get(user_id)
+
+
+def load_profiles_from_db(user_ids):
+    """
+    Load many profiles at once: {user_id: profile} for the ids that have
+    one. Ids not in user_profiles are fetched with chunked WHERE user_id IN
+    (...) queries and cached there; every result (including "no profile")
+    is also memoized for the rest of the request, so pages that look up
+    many members cost at most one query.
+    """
+    user_ids = list(user_ids)
+    memo = g.setdefault("profile_memo", {}) if has_request_context() else {}
+    missing = []
+    cached = {}
+    for uid in dict.fromkeys(user_ids):
+        if uid not in memo:
+            entry = user_profiles.lookup(uid)
+            if entry is None:
+                missing.append(uid)
+            else:
+                cached[uid] = entry
+
+    if cached and PROFILE_CACHE_CHECK_DB and not IS_VERCEL and has_profile_revision(get_db()):
+        # Another worker may have saved some of these profiles since they were cached
+        db = get_db()
+        hits = list(cached)
+        revisions = {}
+        for start in range(0, len(hits), 900):
+            chunk = hits[start:start + 900]
+            placeholders = ",".join("?" * len(chunk))
+            for row in db.execute(
+                f'SELECT user_id, revision FROM profiles WHERE user_id IN ({placeholders})', chunk
+            ).fetchall():
+                revisions[row['user_id']] = row['revision'] or 0
+        for uid in hits:
+            if revisions.get(uid) != cached[uid][0]:
+                # Also drops this process's match scores for the old profile
+                bump_profile_version(uid)
+                del cached[uid]
+                missing.append(uid)
+    for uid, (_, profile) in cached.items():
+        memo[uid] = profile
+
+    if missing:
+        versions = {uid: get_profile_version(uid) for uid in missing}
+        if IS_VERCEL:
+            # Use in-memory storage on Vercel
+            found = {uid: (memory_profiles[uid], 0) for uid in missing if uid in memory_profiles}
+        else:
+            # Use SQLite locally
+            db = get_db()
+            with_revision = has_profile_revision(db)
+            found = {}
+            for start in range(0, len(missing), 900):
+                chunk = missing[start:start + 900]
+                placeholders = ",".join("?" * len(chunk))
+                for row in db.execute(
+                    f'SELECT * FROM profiles WHERE user_id IN ({placeholders})', chunk
+                ).fetchall():
+                    found[row['user_id']] = (profile_from_row(row), (row['revision'] or 0) if with_revision else 0)
+        for uid in missing:
+            profile, revision = found.get(uid, (None, 0))
+            memo[uid] = None if profile is None else user_profiles.put(uid, profile, versions[uid], revision)
+
+    return {uid: memo[uid] for uid in user_ids if memo.get(uid) is not None}
+
+
+# -----------------------------------------------------------------------------
+# Inverted Profile Index
+# Maps topic/language/culture/degree/graduation-year values to sets of user ids
+# so /people and /groups/<name>/invite can narrow candidates before scoring.
+# Built lazily from the profiles table and kept current by save_profile_to_db.
+# Saves made by other workers are caught up on lookup: rows whose revision is
+# above the index's watermark are re-indexed (see PROFILE_CACHE_CHECK_DB).
+# -----------------------------------------------------------------------------
+
+PROFILE_INDEX_FIELDS = ("topic", "language", "culture", "degree", "grad_year")
+profile_index = {field: {} for field in PROFILE_INDEX_FIELDS}  # { field: { value: set(user_id) } }
+profile_index_entries = {}  # { user_id: {keys, people_text, invite_text} }
+profile_index_state = {"loaded": False, "revision": 0}
+profile_index_lock = threading.RLock()
+
+
+def split_csv(value):
+    """Split a comma-joined profile column into a list."""
+    return value.split(',') if value else []
+
+
+def index_profile(user_id, profile_dict, username=None):
+    """Add or refresh a profile's entries in the inverted index."""
+    with profile_index_lock:
+        previous = unindex_profile(user_id)
+        display_name = profile_dict.get("display_name") or ""
+        if not display_name:
+            return
+        if username is None:
+            username = previous.get("username") if previous else None
+        if username is None and not IS_VERCEL:
+            row = get_db().execute('SELECT username FROM users WHERE id = ?', (user_id,)).fetchone()
+            if not row:
+                return
+            username = row['username']
+
+        topics = list(dict.fromkeys(
+            normalize_topic_ids(profile_dict.get("primary_challenge", []) or [])
+            + normalize_topic_ids(profile_dict.get("support_topics", []) or [])
+        ))
+        languages = set(profile_dict.get("languages", []) or [])
+        if profile_dict.get("preferred_language"):
+            languages.add(profile_dict.get("preferred_language"))
+
+        keys = [("topic", t) for t in topics]
+        keys += [("language", lang) for lang in languages if lang]
+        keys += [("culture", c) for c in (profile_dict.get("cultural_background", []) or []) if c]
+        if profile_dict.get("degree_program"):
+            keys.append(("degree", profile_dict["degree_program"]))
+        if profile_dict.get("graduation_year"):
+            keys.append(("grad_year", profile_dict["graduation_year"]))
+        for field, value in keys:
+            profile_index[field].setdefault(value, set()).add(user_id)
+
+        topic_text = ",".join(topics)
+        language = profile_dict.get("preferred_language") or ""
+        profile_index_entries[user_id] = {
+            "keys": keys,
+            "username": username or "",
+            # Same strings the /people and /invite search filters match against
+            "people_text": " ".join([display_name, language, topic_text]).lower(),
+            "invite_text": " ".join([display_name, username or "", language, topic_text]).lower(),
         }
-    return None
 
 
+def unindex_profile(user_id):
+    """Remove a profile from the inverted index. Returns its old entry, if any."""
+    with profile_index_lock:
+        entry = profile_index_entries.pop(user_id, None)
+        if entry:
+            for field, value in entry["keys"]:
+                members = profile_index[field].get(value)
+                if members is not None:
+                    members.discard(user_id)
+                    if not members:
+                        del profile_index[field][value]
+        return entry
+
+
+def index_profile_row(row):
+    """Index a profiles row joined with users.username."""
+    keys = row.keys()
+    index_profile(row['user_id'], {
+        "display_name": row['display_name'],
+        "preferred_language": row['preferred_language'] or '',
+        "primary_challenge": split_csv(row['primary_challenge']),
+        "support_topics": split_csv(row['support_topics']),
+        "languages": split_csv(row['languages']),
+        "cultural_background": split_csv(row['cultural_background']),
+        "graduation_year": (row['graduation_year'] or '') if 'graduation_year' in keys else '',
+        "degree_program": (row['degree_program'] or '') if 'degree_program' in keys else '',
+    }, username=row['username'])
+
+
+def profile_index_watermark(db):
+    """Highest profile revision in the database, or None if it has no revision column."""
+    if not has_profile_revision(db):
+        return None
+    return db.execute('SELECT MAX(revision) FROM profiles').fetchone()[0] or 0
+
+
+def ensure_profile_index():
+    """Build the inverted index from storage on first use, then catch up on other workers' saves."""
+    if profile_index_state["loaded"]:
+        if PROFILE_CACHE_CHECK_DB and not IS_VERCEL:
+            refresh_profile_index()
+        return
+    with profile_index_lock:
+        if profile_index_state["loaded"]:
+            return
+        if IS_VERCEL:
+            for user_id, profile_dict in memory_profiles.items():
+                index_profile(user_id, profile_dict, username="")
+        else:
+            db = get_db()
+            # Read before the rows: a save in between is re-indexed next time
+            profile_index_state["revision"] = profile_index_watermark(db) or 0
+            rows = db.execute('''
+                SELECT p.*, u.username FROM profiles p
+                JOIN users u ON p.user_id = u.id
+                WHERE p.display_name IS NOT NULL AND p.display_name != ''
+            ''').fetchall()
+            for row in rows:
+                index_profile_row(row)
+        profile_index_state["loaded"] = True
+
+
+def refresh_profile_index():
+    """Re-index profiles saved (by any process) since the index's watermark."""
+    db = get_db()
+    watermark = profile_index_watermark(db)
+    if watermark is None or watermark <= profile_index_state["revision"]:
+        return
+    with profile_index_lock:
+        since = profile_index_state["revision"]
+        if watermark <= since:
+            return
+        for row in db.execute('''
+            SELECT p.*, u.username FROM profiles p
+            JOIN users u ON p.user_id = u.id
+            WHERE p.revision > ?
+        ''', (since,)).fetchall():
+            if row['display_name']:
+                index_profile_row(row)
+            else:
+                unindex_profile(row['user_id'])
+        profile_index_state["revision"] = watermark
+
+
+def find_profile_candidates(filters=None, search_query="", search_field="people_text", word_search=False):
+    """
+    Resolve user ids matching all filters by set intersection.
+    filters: { field: [values] } with OR inside a field and AND across fields.
+    search_query narrows by substring on the precomputed search text; with
+    word_search, any query word of 3+ characters may match instead.
+    """
+    ensure_profile_index()
+    with profile_index_lock:
+        candidates = None
+        for field, values in (filters or {}).items():
+            if not values:
+                continue
+            matched = set()
+            for value in values:
+                matched |= profile_index[field].get(value, set())
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                return set()
+        if candidates is None:
+            candidates = set(profile_index_entries)
+
+        if search_query:
+            words = [w for w in search_query.split() if len(w) >= 3] if word_search else []
+            candidates = {
+                uid for uid in candidates
+                if search_query in profile_index_entries[uid][search_field]
+                or any(w in profile_index_entries[uid][search_field] for w in words)
+            }
+        return candidates
+
+
+def fetch_profile_rows(user_ids, exclude_user_id=None):
+    """Fetch profile rows (joined with username) for the given ids only."""
+    ids = [uid for uid in user_ids if uid != exclude_user_id]
+    rows = []
+    db = get_db()
+    for start in range(0, len(ids), 900):
+        chunk = ids[start:start + 900]
+        placeholders = ",".join("?" * len(chunk))
+        rows.extend(db.execute(f'''
+            SELECT p.*, u.username FROM profiles p
+            JOIN users u ON p.user_id = u.id
+            WHERE p.user_id IN ({placeholders}) AND p.display_name IS NOT NULL AND p.display_name != ''
+        ''', chunk).fetchall())
+    return rows
+
 
 def login_required(f):
     """Decorator to require login for routes."""
@@ -372,8 +776,314 @@ PRESET_GROUPS = [
     "💰 Financial Stress",
 ]
 
-# In-memory groups: { "topic": [ {"timestamp": str, "display_name": str, "text": str}, ... ] }
-groups = {topic: [] for topic in PRESET_GROUPS}
+# Each room keeps its newest messages in memory; older ones are spilled in
+# batches to an append-only SQLite table and read back on demand.
+MESSAGE_HOT_LIMIT = int(os.environ.get("MESSAGE_HOT_LIMIT", "200"))
+MESSAGE_SPILL_BATCH = int(os.environ.get("MESSAGE_SPILL_BATCH", "50"))
+# Recent (seq, message id) changes kept per room for incremental polling
+MESSAGE_CHANGELOG_SIZE = int(os.environ.get("MESSAGE_CHANGELOG_SIZE", "500"))
+# The archive lives in its own (gitignored) file so chat history never
+# lands in auth.db.
+CHAT_ARCHIVE_DB = os.environ.get("CHAT_ARCHIVE_DB", ":memory:" if IS_VERCEL else "chat_archive.db")
+
+
+class ChatArchive:
+    """
+    Cold tier for room history: one row per spilled message, keyed by
+    (room, pos). Rows are only ever appended; edits and deletes of archived
+    messages rewrite the payload in place.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def db(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS chat_archive (
+                    room TEXT NOT NULL,
+                    pos INTEGER NOT NULL,
+                    message_id TEXT,
+                    payload TEXT NOT NULL,
+                    deleted INTEGER DEFAULT 0,
+                    PRIMARY KEY (room, pos)
+                )
+            ''')
+            self.conn.execute(
+                'CREATE INDEX IF NOT EXISTS chat_archive_message ON chat_archive (room, message_id)'
+            )
+            self.conn.commit()
+        return self.conn
+
+    def next_pos(self, room):
+        """Position after the newest archived message in room."""
+        with self.lock:
+            row = self.db().execute(
+                'SELECT MAX(pos) FROM chat_archive WHERE room = ?', (room,)
+            ).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def append(self, room, items):
+        """Archive (pos, message) pairs."""
+        with self.lock:
+            db = self.db()
+            db.executemany(
+                'INSERT OR REPLACE INTO chat_archive (room, pos, message_id, payload) VALUES (?, ?, ?, ?)',
+                [(room, pos, msg.get("id"), json.dumps(msg)) for pos, msg in items],
+            )
+            db.commit()
+
+    def find(self, room, msg_id):
+        """Return (pos, message) for a live archived message, or None."""
+        with self.lock:
+            row = self.db().execute(
+                'SELECT pos, payload FROM chat_archive WHERE room = ? AND message_id = ? AND deleted = 0',
+                (room, msg_id),
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def before(self, room, pos, limit):
+        """Return up to `limit` live (pos, message) pairs older than pos, oldest first."""
+        with self.lock:
+            rows = self.db().execute(
+                'SELECT pos, payload FROM chat_archive WHERE room = ? AND pos < ? AND deleted = 0 '
+                'ORDER BY pos DESC LIMIT ?',
+                (room, pos, limit),
+            ).fetchall()
+        return [(row[0], json.loads(row[1])) for row in reversed(rows)]
+
+    def update(self, room, pos, message):
+        with self.lock:
+            db = self.db()
+            db.execute(
+                'UPDATE chat_archive SET payload = ? WHERE room = ? AND pos = ?',
+                (json.dumps(message), room, pos),
+            )
+            db.commit()
+
+    def delete(self, room, pos):
+        with self.lock:
+            db = self.db()
+            db.execute(
+                "UPDATE chat_archive SET deleted = 1, payload = '{}' WHERE room = ? AND pos = ?",
+                (room, pos),
+            )
+            db.commit()
+
+
+chat_archive = ChatArchive(CHAT_ARCHIVE_DB)
+
+
+class MessageLog:
+    """
+    A room's hot history: a bounded list of its newest messages plus an
+    id -> position map. Positions are absolute within the room, so deletes
+    leave a None tombstone instead of shifting the list. Once the list
+    reaches MESSAGE_HOT_LIMIT + MESSAGE_SPILL_BATCH entries the oldest batch
+    is written to the archive and dropped, which also discards tombstones.
+
+    Every append, edit and delete advances the room's seq, is recorded in
+    a bounded change log so pollers can fetch just what changed, and wakes
+    any streaming clients blocked in wait_for_change.
+    """
+
+    def __init__(self, room, archive=None):
+        self.room = room
+        self.archive = archive or chat_archive
+        self.entries = []  # entries[i] holds position base + i, or None once deleted
+        self.positions = {}  # message id -> position
+        self.base = None  # position of entries[0]; loaded from the archive on first use
+        # Seeded from the clock so a restarted server never reissues a seq
+        # a client has already seen
+        self.seq = time.time_ns() // 1000
+        self.changes = deque(maxlen=MESSAGE_CHANGELOG_SIZE)  # (seq, message id)
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+
+    def _load(self):
+        if self.base is None:
+            self.base = self.archive.next_pos(self.room)
+
+    def _record(self, msg_id, message=None):
+        self.seq += 1
+        if message is not None:
+            message["seq"] = self.seq
+        self.changes.append((self.seq, msg_id))
+        self.changed.notify_all()
+
+    def wait_for_change(self, after, timeout):
+        """Block until the room's seq passes `after`; False on timeout."""
+        with self.changed:
+            return self.changed.wait_for(lambda: self.seq > after, timeout)
+
+    def append(self, message):
+        """Add a message; messages with an id become addressable by get/edit/delete."""
+        with self.lock:
+            self._load()
+            msg_id = message.get("id")
+            if msg_id is not None:
+                self.positions[msg_id] = self.base + len(self.entries)
+                self._record(msg_id, message)
+            self.entries.append(message)
+            if len(self.entries) >= MESSAGE_HOT_LIMIT + MESSAGE_SPILL_BATCH:
+                self.spill(MESSAGE_SPILL_BATCH)
+            return message
+
+    def spill(self, count):
+        """Move the oldest `count` entries to the archive."""
+        with self.lock:
+            self._load()
+            batch = self.entries[:count]
+            try:
+                self.archive.append(self.room, [
+                    (self.base + i, msg) for i, msg in enumerate(batch) if msg is not None
+                ])
+            except sqlite3.Error as e:
+                print(f"Chat archive error: {e}")
+                return
+            for msg in batch:
+                if msg is not None and msg.get("id") is not None:
+                    self.positions.pop(msg["id"], None)
+            del self.entries[:count]
+            self.base += len(batch)
+
+    def _locate(self, msg_id):
+        """Return (pos, message, hot) for a live message, or None."""
+        pos = self.positions.get(msg_id)
+        if pos is not None:
+            return pos, self.entries[pos - self.base], True
+        if self.base:
+            found = self.archive.find(self.room, msg_id)
+            if found:
+                return found[0], found[1], False
+        return None
+
+    def get(self, msg_id):
+        """Return the live message with this id, or None."""
+        with self.lock:
+            self._load()
+            found = self._locate(msg_id)
+            return found[1] if found else None
+
+    def update(self, msg_id, **fields):
+        """Set fields on a message and publish the change. Returns the message or None."""
+        with self.lock:
+            self._load()
+            found = self._locate(msg_id)
+            if not found:
+                return None
+            pos, message, hot = found
+            message.update(fields)
+            self._record(msg_id, message)
+            if not hot:
+                self.archive.update(self.room, pos, message)
+            return message
+
+    def edit(self, msg_id, text):
+        """Replace a message's text and mark it edited. Returns the message or None."""
+        return self.update(msg_id, text=text, edited=True)
+
+    def delete(self, msg_id):
+        """Remove the message with this id and return it, or None if absent."""
+        with self.lock:
+            self._load()
+            found = self._locate(msg_id)
+            if not found:
+                return None
+            pos, message, hot = found
+            if hot:
+                del self.positions[msg_id]
+                self.entries[pos - self.base] = None
+            else:
+                self.archive.delete(self.room, pos)
+            self._record(msg_id)
+            return message
+
+    def changes_since(self, after):
+        """
+        Return (messages, deleted_ids) changed after seq `after`, oldest change
+        first, or None when `after` is not covered by the change log.
+        """
+        with self.lock:
+            self._load()
+            oldest = self.changes[0][0] if self.changes else self.seq + 1
+            if after > self.seq or after < oldest - 1:
+                return None
+            seen = set()
+            messages = []
+            deleted = []
+            for seq, msg_id in reversed(self.changes):
+                if seq <= after:
+                    break
+                if msg_id in seen:
+                    continue
+                seen.add(msg_id)
+                found = self._locate(msg_id)
+                if found:
+                    messages.append(found[1])
+                else:
+                    deleted.append(msg_id)
+            messages.reverse()
+            deleted.reverse()
+            return messages, deleted
+
+    def _before(self, pos, limit):
+        """Live (pos, message) pairs older than pos, newest `limit` of them, oldest first."""
+        result = []
+        i = min(pos, self.base + len(self.entries)) - self.base - 1
+        while i >= 0 and len(result) < limit:
+            if self.entries[i] is not None:
+                result.append((self.base + i, self.entries[i]))
+            i -= 1
+        result.reverse()
+        if len(result) < limit and self.base:
+            result = self.archive.before(self.room, min(pos, self.base), limit - len(result)) + result
+        return result
+
+    def recent(self, limit):
+        """Return the newest `limit` live messages, oldest first."""
+        with self.lock:
+            self._load()
+            return [msg for _, msg in self._before(self.base + len(self.entries), limit)]
+
+    def history(self, before=None, limit=200):
+        """
+        Page back through the whole room, id-less messages included: up to
+        `limit` live (pos, message) pairs older than position `before` (the
+        newest ones when None), oldest first. Pass the first pair's pos as
+        the next `before`; an empty page means the history is exhausted.
+        """
+        with self.lock:
+            self._load()
+            end = self.base + len(self.entries)
+            return self._before(end if before is None else before, limit)
+
+    def earlier(self, msg_id, limit):
+        """Return up to `limit` live messages older than msg_id, oldest first."""
+        with self.lock:
+            self._load()
+            found = self._locate(msg_id)
+            if not found:
+                return []
+            return [msg for _, msg in self._before(found[0], limit)]
+
+
+def flush_chat_archive():
+    """Spill every room's hot history so it survives a restart."""
+    for room in list(groups.values()):
+        with room.lock:
+            if room.entries:
+                room.spill(len(room.entries))
+
+
+atexit.register(flush_chat_archive)
+
+
+# In-memory groups: { "topic": MessageLog of {"id", "user_id", "timestamp", "display_name", "text"} }
+groups = {topic: MessageLog(topic) for topic in PRESET_GROUPS}
 
 # Group metadata
 GROUP_TYPES = ["Peer Support", "Study/Accountability", "Identity/Community", "Social"]
@@ -500,7 +1210,7 @@ seed_group_meta()
 def ensure_group_exists(group_name):
     """Ensure a group exists in in-memory stores."""
     if group_name not in groups:
-        groups[group_name] = []
+        groups[group_name] = MessageLog(group_name)
     if group_name not in group_meta:
         group_meta[group_name] = {
             "name": group_name,
@@ -528,9 +1238,6 @@ outgoing_requests = {}
 # Accepted peer connections: { user_id: set() of connected user_ids }
 peer_connections = {}
 
-# User profiles cache for display: { user_id: {display_name, profile_summary} }
-user_profiles = {}
-
 # Basic profanity list for validation
 PROFANITY_LIST = [
     "damn", "hell", "crap", "bastard", "idiot", "stupid", "dumb", "loser",
@@ -580,6 +1287,26 @@ group_embeddings = {}  # {group_name: [float, ...]}
 # HF model for embeddings
 HF_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 HF_API_URL = f"https://api-inference.huggingface.co/pipeline/feature-extraction/{HF_EMBEDDING_MODEL}"
+HF_BATCH_SIZE = int(os.environ.get("HF_BATCH_SIZE", "32"))
+
+# Content-addressed embedding cache: { sha256(text): [float, ...] }
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "10000"))
+embedding_cache = OrderedDict()
+embedding_cache_lock = threading.Lock()
+
+# Shared keep-alive session for the HF Inference API (created lazily)
+_hf_session = None
+_hf_session_lock = threading.Lock()
+
+# Embedding backend: "hf" (Inference API) or "local" (in-process MiniLM).
+# The local backend reads a sentence-transformers checkpoint directory
+# (config.json, vocab.txt, model.safetensors) from EMBEDDING_MODEL_PATH.
+EMBEDDING_MODEL_PATH = os.environ.get("EMBEDDING_MODEL_PATH", os.path.join("models", "all-MiniLM-L6-v2"))
+EMBEDDING_THREADS = int(os.environ.get("EMBEDDING_THREADS", "2"))
+LOCAL_BATCH_SIZE = 16
+_local_encoder = None
+_local_encoder_lock = threading.Lock()
+_embedding_executor = None
 
 
 def build_profile_text(profile_dict):
@@ -592,7 +1319,7 @@ def build_profile_text(profile_dict):
 
     cultural_bg = profile_dict.get("cultural_background", [])
     if cultural_bg:
-        bg_text = ", ".join(cultural_bg) if isinstance(cultural_bg, list) else cultural_bg
+        bg_text = ", ".join(cultural_bg) if isinstance(cultural_bg, (list, tuple)) else cultural_bg
         parts.append(f"My cultural background is {bg_text}.")
 
     challenges = normalize_topic_ids(profile_dict.get("primary_challenge", []))
@@ -636,33 +1363,311 @@ def build_profile_text(profile_dict):
     return " ".join(parts) if parts else "ASU student looking for peer support."
 
 
-def embed_text(text):
+def text_cache_key(text):
+    """Hash text for the content-addressed embedding cache."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def get_hf_session():
+    """Return a pooled requests session reused across embedding calls."""
+    global _hf_session
+    if _hf_session is None:
+        with _hf_session_lock:
+            if _hf_session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _hf_session = session
+    return _hf_session
+
+
+def get_cached_embedding(text):
+    """Return a cached embedding for text, or None."""
+    key = text_cache_key(text)
+    with embedding_cache_lock:
+        embedding = embedding_cache.get(key)
+        if embedding is not None:
+            embedding_cache.move_to_end(key)
+        return embedding
+
+
+def cache_embedding(text, embedding):
+    """Store an embedding in the LRU cache."""
+    key = text_cache_key(text)
+    with embedding_cache_lock:
+        embedding_cache[key] = embedding
+        embedding_cache.move_to_end(key)
+        while len(embedding_cache) > EMBEDDING_CACHE_SIZE:
+            embedding_cache.popitem(last=False)
+
+
+def request_hf_embeddings(texts):
     """
-    Get embedding vector from Hugging Face Inference API.
-    Returns list of floats or None if API fails.
+    Embed a batch of texts with one Hugging Face Inference API call.
+    Returns a list aligned with texts (None entries on failure).
     """
     if os.environ.get("LIVE_AI") != "1":
-        return None
+        return [None] * len(texts)
 
     hf_token = os.environ.get("HF_TOKEN")
     if not hf_token:
-        return None
+        return [None] * len(texts)
 
     try:
-        import requests
         headers = {"Authorization": f"Bearer {hf_token}"}
-        payload = {"inputs": text, "options": {"wait_for_model": True}}
-        response = requests.post(HF_API_URL, headers=headers, json=payload, timeout=10)
+        payload = {"inputs": texts, "options": {"wait_for_model": True}}
+        response = get_hf_session().post(HF_API_URL, headers=headers, json=payload, timeout=10)
 
         if response.status_code == 200:
             result = response.json()
-            if isinstance(result, list) and len(result) > 0:
-                if isinstance(result[0], list):
-                    return result[0]
-                return result
-        return None
+            if isinstance(result, list) and len(result) == len(texts):
+                vectors = []
+                for item in result:
+                    if isinstance(item, list) and item and isinstance(item[0], list):
+                        item = item[0]
+                    vectors.append(item if isinstance(item, list) and item else None)
+                return vectors
+        return [None] * len(texts)
     except Exception:
-        return None
+        return [None] * len(texts)
+
+
+def load_safetensors(path):
+    """Read a .safetensors file into {name: float32 array} without torch."""
+    with open(path, "rb") as f:
+        header_len = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_len))
+    data = np.memmap(path, dtype=np.uint8, mode="r", offset=8 + header_len)
+    dtypes = {"F32": np.float32, "F16": np.float16, "F64": np.float64, "I64": np.int64}
+
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__" or info["dtype"] not in dtypes:
+            continue
+        start, end = info["data_offsets"]
+        array = np.frombuffer(data[start:end], dtype=dtypes[info["dtype"]])
+        tensors[name] = array.reshape(info["shape"]).astype(np.float32)
+    return tensors
+
+
+class WordPieceTokenizer:
+    """Uncased BERT tokenizer (basic split + greedy WordPiece) over vocab.txt."""
+
+    def __init__(self, vocab_path, max_length=256):
+        with open(vocab_path, encoding="utf-8") as f:
+            self.vocab = {line.rstrip("\n"): i for i, line in enumerate(f)}
+        self.max_length = max_length
+        self.unk_id = self.vocab.get("[UNK]", 0)
+        self.cls_id = self.vocab.get("[CLS]", 0)
+        self.sep_id = self.vocab.get("[SEP]", 0)
+
+    @staticmethod
+    def _is_punctuation(char):
+        cp = ord(char)
+        if 33 <= cp <= 47 or 58 <= cp <= 64 or 91 <= cp <= 96 or 123 <= cp <= 126:
+            return True
+        return unicodedata.category(char).startswith("P")
+
+    def basic_tokenize(self, text):
+        text = unicodedata.normalize("NFD", text.lower())
+        chars = []
+        for char in text:
+            category = unicodedata.category(char)
+            if category == "Mn" or char == "\ufffd" or (category.startswith("C") and not char.isspace()):
+                continue
+            if 0x4E00 <= ord(char) <= 0x9FFF or self._is_punctuation(char):
+                chars.append(f" {char} ")
+            else:
+                chars.append(char)
+        return "".join(chars).split()
+
+    def wordpiece(self, word):
+        if len(word) > 100:
+            return [self.unk_id]
+        ids = []
+        start = 0
+        while start < len(word):
+            end = len(word)
+            match = None
+            while start < end:
+                piece = word[start:end] if start == 0 else "##" + word[start:end]
+                if piece in self.vocab:
+                    match = self.vocab[piece]
+                    break
+                end -= 1
+            if match is None:
+                return [self.unk_id]
+            ids.append(match)
+            start = end
+        return ids
+
+    def encode(self, text):
+        ids = [piece for word in self.basic_tokenize(text) for piece in self.wordpiece(word)]
+        return [self.cls_id] + ids[:self.max_length - 2] + [self.sep_id]
+
+
+class LocalMiniLMEncoder:
+    """
+    Pure-NumPy forward pass of a BERT-style sentence encoder such as
+    all-MiniLM-L6-v2: mean pooling over token states, then L2 normalization.
+    GELU uses the tanh approximation, which shifts outputs by well under 1e-3.
+    """
+
+    def __init__(self, model_dir):
+        with open(os.path.join(model_dir, "config.json")) as f:
+            config = json.load(f)
+        self.num_heads = config.get("num_attention_heads", 12)
+        self.num_layers = config.get("num_hidden_layers", 6)
+        self.eps = config.get("layer_norm_eps", 1e-12)
+        self.tokenizer = WordPieceTokenizer(
+            os.path.join(model_dir, "vocab.txt"),
+            max_length=min(256, config.get("max_position_embeddings", 512)),
+        )
+        weights = load_safetensors(os.path.join(model_dir, "model.safetensors"))
+        self.weights = {
+            (name[5:] if name.startswith("bert.") else name)
+            .replace("LayerNorm.gamma", "LayerNorm.weight")
+            .replace("LayerNorm.beta", "LayerNorm.bias"): value
+            for name, value in weights.items()
+        }
+
+    def _w(self, name):
+        return self.weights[name]
+
+    def _layer_norm(self, x, prefix):
+        mean = x.mean(axis=-1, keepdims=True)
+        var = x.var(axis=-1, keepdims=True)
+        return (x - mean) / np.sqrt(var + self.eps) * self._w(prefix + ".weight") + self._w(prefix + ".bias")
+
+    def _dense(self, x, prefix):
+        return x @ self._w(prefix + ".weight").T + self._w(prefix + ".bias")
+
+    def encode(self, texts):
+        """Return an array of shape (len(texts), hidden) of unit-length embeddings."""
+        token_ids = [self.tokenizer.encode(text) for text in texts]
+        length = max(len(ids) for ids in token_ids)
+        ids = np.zeros((len(texts), length), dtype=np.int64)
+        mask = np.zeros((len(texts), length), dtype=np.float32)
+        for i, row in enumerate(token_ids):
+            ids[i, :len(row)] = row
+            mask[i, :len(row)] = 1.0
+
+        x = (self._w("embeddings.word_embeddings.weight")[ids]
+             + self._w("embeddings.position_embeddings.weight")[:length]
+             + self._w("embeddings.token_type_embeddings.weight")[0])
+        x = self._layer_norm(x, "embeddings.LayerNorm")
+
+        batch, _, hidden = x.shape
+        head_dim = hidden // self.num_heads
+        attn_bias = ((1.0 - mask) * -1e4)[:, None, None, :]
+
+        def heads(t):
+            return t.reshape(batch, length, self.num_heads, head_dim).transpose(0, 2, 1, 3)
+
+        for layer in range(self.num_layers):
+            prefix = f"encoder.layer.{layer}"
+            q = heads(self._dense(x, prefix + ".attention.self.query"))
+            k = heads(self._dense(x, prefix + ".attention.self.key"))
+            v = heads(self._dense(x, prefix + ".attention.self.value"))
+            scores = q @ k.transpose(0, 1, 3, 2) / np.sqrt(head_dim) + attn_bias
+            scores = np.exp(scores - scores.max(axis=-1, keepdims=True))
+            probs = scores / scores.sum(axis=-1, keepdims=True)
+            context = (probs @ v).transpose(0, 2, 1, 3).reshape(batch, length, hidden)
+            x = self._layer_norm(x + self._dense(context, prefix + ".attention.output.dense"),
+                                 prefix + ".attention.output.LayerNorm")
+            inter = self._dense(x, prefix + ".intermediate.dense")
+            inter = 0.5 * inter * (1.0 + np.tanh(0.7978845608 * (inter + 0.044715 * inter ** 3)))
+            x = self._layer_norm(x + self._dense(inter, prefix + ".output.dense"),
+                                 prefix + ".output.LayerNorm")
+
+        pooled = (x * mask[:, :, None]).sum(axis=1) / np.maximum(mask.sum(axis=1, keepdims=True), 1e-9)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.maximum(norms, 1e-12)
+
+
+def get_local_encoder():
+    """Load the local encoder once; returns None if numpy or the checkpoint is missing."""
+    global _local_encoder
+    if _local_encoder is None and np is not None:
+        with _local_encoder_lock:
+            if _local_encoder is None:
+                try:
+                    _local_encoder = LocalMiniLMEncoder(EMBEDDING_MODEL_PATH)
+                except (OSError, KeyError, ValueError) as e:
+                    print(f"Local embedding model unavailable: {e}")
+                    _local_encoder = False
+    return _local_encoder or None
+
+
+def get_embedding_executor():
+    """Thread pool shared by local batch encoding."""
+    global _embedding_executor
+    if _embedding_executor is None:
+        with _local_encoder_lock:
+            if _embedding_executor is None:
+                _embedding_executor = ThreadPoolExecutor(
+                    max_workers=EMBEDDING_THREADS, thread_name_prefix="embed"
+                )
+    return _embedding_executor
+
+
+def request_local_embeddings(texts):
+    """
+    Embed texts with the in-process encoder. Texts are length-sorted into
+    batches (less padding) and encoded in parallel on the embedding pool.
+    """
+    encoder = get_local_encoder()
+    if encoder is None or not texts:
+        return [None] * len(texts)
+
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    batches = [order[i:i + LOCAL_BATCH_SIZE] for i in range(0, len(order), LOCAL_BATCH_SIZE)]
+    encoded = get_embedding_executor().map(
+        lambda batch: encoder.encode([texts[i] for i in batch]), batches
+    )
+
+    results = [None] * len(texts)
+    for batch, vectors in zip(batches, encoded):
+        for i, vector in zip(batch, vectors):
+            results[i] = vector.tolist()
+    return results
+
+
+def embed_texts(texts):
+    """
+    Get embedding vectors for many texts from the configured backend.
+    Cached texts cost nothing; misses are deduplicated and sent in batches
+    of HF_BATCH_SIZE (hf) or encoded in-process (local).
+    Returns a list aligned with texts (None on failure).
+    """
+    results = [get_cached_embedding(text) for text in texts]
+    missing = list(dict.fromkeys(t for t, r in zip(texts, results) if r is None))
+
+    fetched = {}
+    if os.environ.get("EMBEDDING_BACKEND", "hf") == "local":
+        batches = [missing]
+        request_batch = request_local_embeddings
+    else:
+        batches = [missing[i:i + HF_BATCH_SIZE] for i in range(0, len(missing), HF_BATCH_SIZE)]
+        request_batch = request_hf_embeddings
+    for batch in batches:
+        for text, embedding in zip(batch, request_batch(batch)):
+            if embedding:
+                cache_embedding(text, embedding)
+                fetched[text] = embedding
+
+    return [r if r is not None else fetched.get(t) for t, r in zip(texts, results)]
+
+
+def embed_text(text):
+    """
+    Get embedding vector from the configured embedding backend.
+    Returns list of floats or None if the backend fails.
+    """
+    return embed_texts([text])[0]
 
 
 def cosine_similarity(vec_a, vec_b):
@@ -680,6 +1685,449 @@ def cosine_similarity(vec_a, vec_b):
     return dot_product / (magnitude_a * magnitude_b)
 
 
+class EmbeddingStore:
+    """
+    Contiguous matrix of L2-normalized embeddings with an id <-> row map.
+    Top-k queries are a single matrix-vector product plus argpartition.
+    Requires numpy; callers fall back to get_top_matches without it.
+    """
+
+    def __init__(self):
+        self.ids = []  # row -> key
+        self.rows = {}  # key -> row
+        self.matrix = None  # float32 array of shape (capacity, dim)
+        self.dim = None
+        self.index = None  # optional IVFIndex for approximate queries
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def add(self, key, embedding):
+        """
+        Insert or replace the vector for key. Zero vectors are dropped, and so
+        are vectors whose dimension differs from the store's (with a warning:
+        usually the embedding model or backend changed).
+        """
+        vec = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vec)) if vec.size else 0.0
+
+        with self.lock:
+            if self.dim is not None and vec.size != self.dim:
+                print(f"Embedding dimension mismatch for {key!r}: got {vec.size}, store holds {self.dim}; vector dropped")
+                self.remove(key)
+                return False
+            if norm == 0:
+                self.remove(key)
+                return False
+            vec = vec / norm
+
+            if self.matrix is None:
+                self.dim = vec.size
+                self.matrix = np.zeros((16, self.dim), dtype=np.float32)
+
+            row = self.rows.get(key)
+            if row is None:
+                row = len(self.ids)
+                if row >= self.matrix.shape[0]:
+                    grown = np.zeros((max(16, row * 2), self.dim), dtype=np.float32)
+                    grown[:row] = self.matrix[:row]
+                    self.matrix = grown
+                self.ids.append(key)
+                self.rows[key] = row
+            self.matrix[row] = vec
+            if self.index is not None:
+                self.index.add(key, vec)
+            return True
+
+    def remove(self, key):
+        """Remove key by moving the last row into its slot."""
+        with self.lock:
+            row = self.rows.pop(key, None)
+            if row is None:
+                return False
+            last = len(self.ids) - 1
+            if row != last:
+                last_key = self.ids[last]
+                self.matrix[row] = self.matrix[last]
+                self.ids[row] = last_key
+                self.rows[last_key] = row
+            self.ids.pop()
+            if self.index is not None:
+                self.index.remove(key)
+            return True
+
+    def vector(self, key):
+        """Return the normalized vector for key as a list, or None."""
+        with self.lock:
+            row = self.rows.get(key)
+            if row is None:
+                return None
+            return self.matrix[row].tolist()
+
+    def snapshot(self):
+        """Return (ids, matrix) copies safe to write while requests keep mutating."""
+        with self.lock:
+            count = len(self.ids)
+            return list(self.ids), self.matrix[:count].copy() if count else None
+
+    def load(self, ids, matrix):
+        """Replace contents with a (possibly memory-mapped) matrix of normalized rows."""
+        with self.lock:
+            self.ids = list(ids)
+            self.rows = {key: row for row, key in enumerate(self.ids)}
+            self.matrix = matrix
+            self.dim = matrix.shape[1]
+        # Outside the lock: train() takes it only to snapshot and to swap in
+        if self.index is not None and len(self.ids) >= self.index.min_train_size:
+            self.index.train()
+
+    def top_k(self, query, top_n=5, threshold=0.3, exclude=None, exact=False):
+        """
+        Return [(key, similarity), ...] sorted by similarity descending.
+        Uses the attached index unless exact=True or the index is untrained.
+        Holds the lock throughout: the embedding refresh worker adds and
+        removes rows (moving the last row into freed slots) while requests
+        query the store.
+        """
+        if top_n <= 0 or query is None:
+            return []
+        q = np.asarray(query, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(q)) if q.size else 0.0
+        if norm == 0:
+            return []
+        q = q / norm
+
+        with self.lock:
+            count = len(self.ids)
+            if not count or q.size != self.dim:
+                return []
+
+            rows = None
+            if self.index is not None and not exact:
+                rows = self.index.candidate_rows(q)
+            if rows is None:
+                rows = np.arange(count)
+                scores = self.matrix[:count] @ q
+            else:
+                scores = self.matrix[rows] @ q
+            if not len(rows):
+                return []
+            if exclude is not None and exclude in self.rows:
+                scores[rows == self.rows[exclude]] = -np.inf
+
+            k = min(top_n, len(rows))
+            if k < len(rows):
+                idx = np.argpartition(-scores, k - 1)[:k]
+            else:
+                idx = np.arange(len(rows))
+            idx = idx[np.argsort(-scores[idx], kind="stable")]
+            return [(self.ids[rows[i]], float(scores[i])) for i in idx if scores[i] >= threshold]
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over an EmbeddingStore.
+    Vectors are bucketed by their nearest k-means centroid; queries only scan
+    the nprobe closest buckets. Raising nprobe trades latency for recall.
+    """
+
+    def __init__(self, store, nprobe=8, nlist=None, min_train_size=1024, seed=0):
+        self.store = store
+        self.nprobe = nprobe
+        self.nlist = nlist  # None -> sqrt(n) at training time
+        self.min_train_size = min_train_size
+        self.seed = seed
+        self.centroids = None
+        self.lists = []  # bucket -> set of keys
+        self.assignments = {}  # key -> bucket
+        self.trained_size = 0
+        # k-means runs on a snapshot outside the store lock; keys added or
+        # removed meanwhile are collected in pending and re-bucketed when
+        # the new index is swapped in
+        self.train_lock = threading.Lock()
+        self.training = False
+        self.pending = set()
+        self.training_thread = None
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def train(self, iterations=10):
+        """Run spherical k-means over a snapshot of the store and swap in the new buckets."""
+        with self.train_lock:
+            with self.store.lock:
+                ids, data = self.store.snapshot()
+                self.training = True
+                self.pending = set()
+            try:
+                if data is None:
+                    return False
+                centroids, lists, assignments = self.build(ids, data, iterations)
+                with self.store.lock:
+                    for key in self.pending:
+                        previous = assignments.pop(key, None)
+                        if previous is not None:
+                            lists[previous].discard(key)
+                        row = self.store.rows.get(key)
+                        if row is not None:
+                            bucket = int(np.argmax(centroids @ self.store.matrix[row]))
+                            lists[bucket].add(key)
+                            assignments[key] = bucket
+                    self.centroids, self.lists, self.assignments = centroids, lists, assignments
+                    self.trained_size = len(ids)
+                return True
+            finally:
+                with self.store.lock:
+                    self.training = False
+                    self.pending = set()
+
+    def build(self, ids, data, iterations):
+        """k-means over (ids, data): returns (centroids, lists, assignments)."""
+        count = len(ids)
+        nlist = min(count, self.nlist or max(1, int(count ** 0.5)))
+        rng = np.random.default_rng(self.seed)
+        centroids = data[rng.choice(count, nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assign = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, data)
+            norms = np.linalg.norm(sums, axis=1)
+            empty = norms == 0
+            if empty.any():
+                sums[empty] = data[rng.choice(count, int(empty.sum()))]
+                norms[empty] = np.linalg.norm(sums[empty], axis=1)
+            centroids = sums / norms[:, None]
+
+        assign = np.argmax(data @ centroids.T, axis=1)
+        lists = [set() for _ in range(nlist)]
+        assignments = {}
+        for row, bucket in enumerate(assign):
+            lists[bucket].add(ids[row])
+            assignments[ids[row]] = int(bucket)
+        return centroids.astype(np.float32), lists, assignments
+
+    def retrain_in_background(self):
+        """Start a background train() unless one is already running (call under the store lock)."""
+        if self.training:
+            return
+        self.training = True
+        self.training_thread = threading.Thread(target=self.train, name="ivf-train", daemon=True)
+        self.training_thread.start()
+
+    def wait(self, timeout=None):
+        """Wait for a background training run; True if none is left running."""
+        thread = self.training_thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def add(self, key, vec):
+        """Assign a new or updated vector to its bucket, retraining in the background as the store grows."""
+        count = len(self.store)
+        if self.training:
+            self.pending.add(key)
+        if not self.is_trained:
+            if count >= self.min_train_size:
+                self.retrain_in_background()
+            return
+        if count >= 2 * self.trained_size:
+            self.retrain_in_background()
+        bucket = int(np.argmax(self.centroids @ vec))
+        previous = self.assignments.get(key)
+        if previous is not None:
+            self.lists[previous].discard(key)
+        self.lists[bucket].add(key)
+        self.assignments[key] = bucket
+
+    def remove(self, key):
+        if self.training:
+            self.pending.add(key)
+        bucket = self.assignments.pop(key, None)
+        if bucket is not None:
+            self.lists[bucket].discard(key)
+
+    def candidate_rows(self, query):
+        """Rows in the nprobe buckets closest to a normalized query, or None if untrained."""
+        with self.store.lock:
+            if not self.is_trained:
+                return None
+            nprobe = min(self.nprobe, len(self.lists))
+            closest = self.centroids @ query
+            if nprobe < len(self.lists):
+                buckets = np.argpartition(-closest, nprobe - 1)[:nprobe]
+            else:
+                buckets = range(len(self.lists))
+            rows = self.store.rows
+            return np.fromiter(
+                (rows[key] for bucket in buckets for key in self.lists[bucket]),
+                dtype=np.int64,
+            )
+
+    def measure_recall(self, top_n=10, sample=100):
+        """
+        Compare ANN results with the exact scan for sampled stored vectors.
+        Returns recall@top_n and mean per-query latency in milliseconds.
+        """
+        import time
+
+        count = len(self.store)
+        report = {"size": count, "nlist": len(self.lists), "nprobe": self.nprobe,
+                  "recall": 1.0, "ann_ms": 0.0, "exact_ms": 0.0}
+        if not count:
+            return report
+        rng = np.random.default_rng(self.seed)
+        queries = rng.choice(count, min(sample, count), replace=False)
+
+        hits = 0
+        total = 0
+        ann_time = 0.0
+        exact_time = 0.0
+        for row in queries:
+            query = self.store.matrix[row].copy()
+            start = time.perf_counter()
+            approx = self.store.top_k(query, top_n=top_n, threshold=-1.0)
+            ann_time += time.perf_counter() - start
+            start = time.perf_counter()
+            exact = self.store.top_k(query, top_n=top_n, threshold=-1.0, exact=True)
+            exact_time += time.perf_counter() - start
+            expected = {key for key, _ in exact}
+            hits += len(expected & {key for key, _ in approx})
+            total += len(expected)
+
+        report["recall"] = hits / total if total else 1.0
+        report["ann_ms"] = ann_time * 1000 / len(queries)
+        report["exact_ms"] = exact_time * 1000 / len(queries)
+        return report
+
+
+def create_embedding_store():
+    """Build an EmbeddingStore, attaching an IVF index when ANN_INDEX=1."""
+    if np is None:
+        return None
+    store = EmbeddingStore()
+    if os.environ.get("ANN_INDEX") == "1":
+        store.index = IVFIndex(
+            store,
+            nprobe=int(os.environ.get("ANN_NPROBE", "8")),
+            min_train_size=int(os.environ.get("ANN_MIN_TRAIN_SIZE", "1024")),
+        )
+    return store
+
+
+# Vector stores backing the list-valued entries of the dicts above. Vectors
+# loaded from disk at startup live only here until the profile is re-embedded.
+user_embedding_store = create_embedding_store()
+group_embedding_store = create_embedding_store()
+
+# On-disk snapshots: <name>.npy (float32 rows) plus <name>.json (row ids)
+EMBEDDINGS_DIR = os.environ.get("EMBEDDINGS_DIR", "embeddings")
+EMBEDDING_FLUSH_INTERVAL = float(os.environ.get("EMBEDDING_FLUSH_INTERVAL", "30"))
+# "loaded" holds the snapshot names this process has read back; a store is
+# only ever written after that, so a process that skipped loading cannot
+# replace a full snapshot with the few vectors it computed itself.
+_embedding_flush_state = {"last_flush": 0.0, "dirty": False, "loaded": set()}
+_embedding_flush_lock = threading.Lock()
+
+
+def save_embedding_store(store, name):
+    """Atomically write a store snapshot to EMBEDDINGS_DIR."""
+    if store is None or store.dim is None or IS_VERCEL:
+        return False
+    ids, matrix = store.snapshot()
+    if matrix is None:
+        matrix = np.zeros((0, store.dim), dtype=np.float32)
+
+    os.makedirs(EMBEDDINGS_DIR, exist_ok=True)
+    base = os.path.join(EMBEDDINGS_DIR, name)
+    tmp = f"{base}.{secrets.token_hex(4)}.tmp"
+    try:
+        np.save(tmp + ".npy", matrix)
+        with open(tmp + ".json", "w") as f:
+            json.dump({"ids": ids}, f)
+        os.replace(tmp + ".npy", base + ".npy")
+        os.replace(tmp + ".json", base + ".json")
+    finally:
+        for leftover in (tmp + ".npy", tmp + ".json"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return True
+
+
+def load_embedding_store(store, name):
+    """Memory-map a saved snapshot into store. Returns the number of rows loaded."""
+    if store is None or IS_VERCEL:
+        return 0
+    _embedding_flush_state["loaded"].add(name)
+    base = os.path.join(EMBEDDINGS_DIR, name)
+    try:
+        matrix = np.load(base + ".npy", mmap_mode="c")
+        with open(base + ".json") as f:
+            ids = json.load(f)["ids"]
+    except (OSError, ValueError, KeyError):
+        return 0
+    if matrix.ndim != 2 or len(ids) != matrix.shape[0] or not ids:
+        return 0
+    if store.dim is not None and matrix.shape[1] != store.dim:
+        print(f"Embedding snapshot {name} has dimension {matrix.shape[1]}, store holds {store.dim}; not loaded")
+        return 0
+    store.load(ids, matrix)
+    return len(ids)
+
+
+def load_embeddings():
+    """Restore user and group vectors saved by a previous process."""
+    return (load_embedding_store(user_embedding_store, "user_embeddings"),
+            load_embedding_store(group_embedding_store, "group_embeddings"))
+
+
+def flush_embeddings(force=False):
+    """
+    Persist loaded stores if dirty and the flush interval has elapsed (or
+    force). Flushes are serialized; a non-forced flush that finds another
+    one running leaves the dirty flag for the next call. Write errors are
+    logged, not raised, and keep the stores dirty.
+    """
+    state = _embedding_flush_state
+    if not state["dirty"]:
+        return False
+    if not _embedding_flush_lock.acquire(blocking=force):
+        return False
+    try:
+        now = time.monotonic()
+        if not state["dirty"] or (not force and now - state["last_flush"] < EMBEDDING_FLUSH_INTERVAL):
+            return False
+        state["dirty"] = False
+        state["last_flush"] = now
+        for store, name in ((user_embedding_store, "user_embeddings"),
+                            (group_embedding_store, "group_embeddings")):
+            if name not in state["loaded"]:
+                continue
+            try:
+                save_embedding_store(store, name)
+            except OSError as e:
+                print(f"Embedding snapshot error ({name}): {e}")
+                state["dirty"] = True
+        return True
+    finally:
+        _embedding_flush_lock.release()
+
+
+def mark_embeddings_dirty():
+    """Schedule the stores for the next flush."""
+    _embedding_flush_state["dirty"] = True
+    flush_embeddings()
+
+
+atexit.register(flush_embeddings, force=True)
+
+
 def get_top_matches(target_embedding, candidates, top_n=5, threshold=0.3):
     """
     Find top matching candidates based on cosine similarity.
@@ -740,33 +2188,199 @@ def get_keyword_matches(target_text, candidates_text, top_n=5, threshold=0.1):
 def store_user_embedding(user_id, profile_dict):
     """Generate and store embedding for a user profile."""
     profile_text = build_profile_text(profile_dict)
-    embedding = embed_text(profile_text)
+    return apply_user_embedding(user_id, profile_text, embed_text(profile_text))
+
 
+def apply_user_embedding(user_id, profile_text, embedding):
+    """Store an embedding (or the text fallback if None) for a user profile."""
     if embedding:
         user_embeddings[user_id] = embedding
     else:
         user_embeddings[user_id] = {"text": profile_text}
 
+    if user_embedding_store is not None:
+        if embedding:
+            changed = user_embedding_store.add(user_id, embedding)
+        else:
+            changed = user_embedding_store.remove(user_id)
+        if changed:
+            mark_embeddings_dirty()
+
     return embedding is not None
 
 
+# Profile saves enqueue an embedding refresh instead of embedding inline.
+# One worker thread drains the queue: repeated saves for a user coalesce to
+# the latest profile text, and up to EMBEDDING_QUEUE_BATCH users are embedded
+# per embed_texts call. Set EMBEDDING_QUEUE_DB to a SQLite path to keep
+# pending jobs across restarts (replayed at startup); EMBEDDING_QUEUE=0
+# embeds inline as before.
+EMBEDDING_QUEUE = os.environ.get("EMBEDDING_QUEUE", "0" if IS_VERCEL else "1") == "1"
+EMBEDDING_QUEUE_BATCH = int(os.environ.get("EMBEDDING_QUEUE_BATCH", "32"))
+EMBEDDING_QUEUE_DB = os.environ.get("EMBEDDING_QUEUE_DB", "")
+
+
+class EmbeddingRefreshQueue:
+    """
+    Pending profile embedding refreshes, keyed by user id. Each key holds
+    only the newest profile text, so a user who saves five times while the
+    embedding service is slow is embedded once.
+    """
+
+    def __init__(self, path=""):
+        self.path = path
+        self.conn = None
+        self.pending = OrderedDict()  # user_id -> profile text
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.worker = None
+
+    def db(self):
+        """SQLite connection for durable jobs, or None when EMBEDDING_QUEUE_DB is unset."""
+        if self.path and self.conn is None:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS embedding_jobs (
+                    user_id INTEGER PRIMARY KEY,
+                    profile_text TEXT NOT NULL,
+                    queued_at REAL NOT NULL
+                )
+            ''')
+            self.conn.commit()
+        return self.conn
+
+    def enqueue(self, user_id, profile_text):
+        """Queue (or replace) the refresh for user_id and wake the worker."""
+        with self.lock:
+            db = self.db()
+            if db is not None:
+                db.execute(
+                    'INSERT OR REPLACE INTO embedding_jobs (user_id, profile_text, queued_at) VALUES (?, ?, ?)',
+                    (user_id, profile_text, time.time()),
+                )
+                db.commit()
+            self.pending[user_id] = profile_text
+            self._start_worker()
+            self.changed.notify_all()
+
+    def replay(self):
+        """Re-queue jobs persisted by a previous process. Returns how many."""
+        with self.lock:
+            db = self.db()
+            if db is None:
+                return 0
+            rows = db.execute(
+                'SELECT user_id, profile_text FROM embedding_jobs ORDER BY queued_at'
+            ).fetchall()
+            for user_id, profile_text in rows:
+                self.pending.setdefault(user_id, profile_text)
+            if rows:
+                self._start_worker()
+                self.changed.notify_all()
+        return len(rows)
+
+    def drain(self, timeout=None):
+        """Wait until every queued refresh has been applied. Returns False on timeout."""
+        with self.lock:
+            return self.changed.wait_for(lambda: not self.pending and not self.in_flight, timeout)
+
+    def _start_worker(self):
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self._run, name="embedding-refresh", daemon=True)
+            self.worker.start()
+
+    def _take_batch(self):
+        with self.lock:
+            self.changed.wait_for(lambda: self.pending)
+            batch = []
+            while self.pending and len(batch) < EMBEDDING_QUEUE_BATCH:
+                batch.append(self.pending.popitem(last=False))
+            self.in_flight = len(batch)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                refresh_user_embeddings(batch)
+            except Exception as e:
+                print(f"Embedding refresh error: {e}")
+            with self.lock:
+                db = self.db()
+                if db is not None:
+                    # Only clear jobs that were not re-queued with newer text meanwhile
+                    db.executemany(
+                        'DELETE FROM embedding_jobs WHERE user_id = ? AND profile_text = ?', batch
+                    )
+                    db.commit()
+                self.in_flight = 0
+                self.changed.notify_all()
+
+
+embedding_refresh_queue = EmbeddingRefreshQueue(EMBEDDING_QUEUE_DB)
+atexit.register(embedding_refresh_queue.drain, timeout=5)
+
+
+def refresh_user_embeddings(jobs):
+    """Embed (user_id, profile text) pairs with one batched call and store the results."""
+    embeddings = embed_texts([profile_text for _, profile_text in jobs])
+    for (user_id, profile_text), embedding in zip(jobs, embeddings):
+        apply_user_embedding(user_id, profile_text, embedding)
+
+
+def schedule_user_embedding(user_id, profile_dict):
+    """Refresh a user's embedding in the background (inline if EMBEDDING_QUEUE=0)."""
+    if not EMBEDDING_QUEUE:
+        store_user_embedding(user_id, profile_dict)
+        return
+    embedding_refresh_queue.enqueue(user_id, build_profile_text(profile_dict))
+
+
 def store_group_embedding(group_name):
     """Generate and store embedding for a group topic."""
     if group_name in group_embeddings:
         return True
+    if group_embedding_store is not None and group_name in group_embedding_store:
+        return True
 
     embedding = embed_text(group_name)
 
     if embedding:
         group_embeddings[group_name] = embedding
+        if group_embedding_store is not None:
+            group_embedding_store.add(group_name, embedding)
+            mark_embeddings_dirty()
     else:
         group_embeddings[group_name] = {"text": group_name}
 
     return embedding is not None
 
 
+def get_user_embedding_data(user_id):
+    """Return a user's embedding list (or text fallback dict), including vectors loaded from disk."""
+    user_data = user_embeddings.get(user_id)
+    if user_data is None and user_embedding_store is not None:
+        user_data = user_embedding_store.vector(user_id)
+    return user_data
+
+
+def get_group_embedding_data(group_name):
+    """Return a group's embedding list (or text fallback dict), including vectors loaded from disk."""
+    group_data = group_embeddings.get(group_name)
+    if group_data is None and group_embedding_store is not None:
+        group_data = group_embedding_store.vector(group_name)
+    return group_data
+
+
 def init_group_embeddings():
     """Initialize embeddings for all preset groups."""
+    # Warm the cache with one batched request instead of one call per group
+    embed_texts([
+        name for name in PRESET_GROUPS
+        if name not in group_embeddings
+        and not (group_embedding_store is not None and name in group_embedding_store)
+    ])
     for group_name in PRESET_GROUPS:
         store_group_embedding(group_name)
 
@@ -776,20 +2390,22 @@ def get_recommended_groups_semantic(user_id, top_n=5):
     Get recommended groups for a user using semantic matching.
     Falls back to keyword matching if embeddings unavailable.
     """
-    user_data = user_embeddings.get(user_id)
+    user_data = get_user_embedding_data(user_id)
 
     if not user_data:
         return list(PRESET_GROUPS)[:top_n]
 
     if isinstance(user_data, list):
-        valid_embeddings = {
-            k: v for k, v in group_embeddings.items()
-            if isinstance(v, list)
-        }
-        if valid_embeddings:
+        if group_embedding_store is not None:
+            matches = group_embedding_store.top_k(user_data, top_n=top_n, threshold=0.2)
+        else:
+            valid_embeddings = {
+                k: v for k, v in group_embeddings.items()
+                if isinstance(v, list)
+            }
             matches = get_top_matches(user_data, valid_embeddings, top_n=top_n, threshold=0.2)
-            if matches:
-                return [m[0] for m in matches]
+        if matches:
+            return [m[0] for m in matches]
 
     user_text = user_data.get("text", "") if isinstance(user_data, dict) else ""
     if user_text:
@@ -810,20 +2426,17 @@ def get_similar_users(user_id, top_n=5, threshold=0.4):
     Excludes self from results.
     Falls back to keyword matching if embeddings unavailable.
     """
-    user_data = user_embeddings.get(user_id)
+    user_data = get_user_embedding_data(user_id)
 
     if not user_data:
         return []
 
-    other_users = {k: v for k, v in user_embeddings.items() if k != user_id}
-
-    if not other_users:
-        return []
-
     if isinstance(user_data, list):
+        if user_embedding_store is not None:
+            return user_embedding_store.top_k(user_data, top_n=top_n, threshold=threshold, exclude=user_id)
         valid_embeddings = {
-            k: v for k, v in other_users.items()
-            if isinstance(v, list)
+            k: v for k, v in user_embeddings.items()
+            if k != user_id and isinstance(v, list)
         }
         if valid_embeddings:
             matches = get_top_matches(user_data, valid_embeddings, top_n=top_n, threshold=threshold)
@@ -833,7 +2446,8 @@ def get_similar_users(user_id, top_n=5, threshold=0.4):
     if user_text:
         other_texts = {
             k: v.get("text", "") if isinstance(v, dict) else ""
-            for k, v in other_users.items()
+            for k, v in user_embeddings.items()
+            if k != user_id
         }
         matches = get_keyword_matches(user_text, other_texts, top_n=top_n, threshold=0.1)
         return [(m[0], m[1]) for m in matches]
@@ -846,23 +2460,27 @@ def get_users_for_group(group_name, top_n=10):
     Find users who might be interested in a specific group.
     Used for group creation and suggestions.
     """
-    group_data = group_embeddings.get(group_name)
+    group_data = get_group_embedding_data(group_name)
 
     if not group_data:
         store_group_embedding(group_name)
-        group_data = group_embeddings.get(group_name)
+        group_data = get_group_embedding_data(group_name)
 
     if not group_data:
         return []
 
     if isinstance(group_data, list):
-        valid_users = {
-            k: v for k, v in user_embeddings.items()
-            if isinstance(v, list)
-        }
-        if valid_users:
-            matches = get_top_matches(group_data, valid_users, top_n=top_n, threshold=0.3)
-            return [(m[0], m[1]) for m in matches]
+        if user_embedding_store is not None:
+            if len(user_embedding_store):
+                return user_embedding_store.top_k(group_data, top_n=top_n, threshold=0.3)
+        else:
+            valid_users = {
+                k: v for k, v in user_embeddings.items()
+                if isinstance(v, list)
+            }
+            if valid_users:
+                matches = get_top_matches(group_data, valid_users, top_n=top_n, threshold=0.3)
+                return [(m[0], m[1]) for m in matches]
 
     group_text = group_data.get("text", group_name) if isinstance(group_data, dict) else group_name
     user_texts = {
@@ -876,25 +2494,87 @@ def get_users_for_group(group_name, top_n=10):
 # AI Abstraction Functions
 # -----------------------------------------------------------------------------
 
+class ModerationMatcher:
+    """
+    All moderation lexicons compiled once. A single combined regex finds
+    the next position where any lexicon matches, so clean text costs one
+    search; at each hit, optional lookaheads record every category that
+    matches there. Categories:
+
+      offensive        - OFFENSIVE_PATTERNS
+      profanity        - PROFANITY_LIST as whole words
+      profanity_substr - PROFANITY_LIST anywhere, even inside a word
+      severe_distress  - SEVERE_DISTRESS_KEYWORDS anywhere
+    """
+
+    def __init__(self, offensive_patterns, profanity, distress_keywords):
+        words = "|".join(re.escape(w) for w in profanity)
+        lexicons = {
+            "offensive": "(?i:" + "|".join(f"(?:{p})" for p in offensive_patterns) + ")",
+            "profanity": rf"\b(?:{words})\b",
+            "profanity_substr": f"(?:{words})",
+            "severe_distress": "(?:" + "|".join(re.escape(k) for k in distress_keywords) + ")",
+        }
+        self.categories = list(lexicons)
+        # Whole-word profanity is covered by the substring alternative
+        self.gate = re.compile("|".join(v for k, v in lexicons.items() if k != "profanity"))
+        self.probes = re.compile("".join(f"(?=(?P<{k}>{v})|)" for k, v in lexicons.items()))
+
+    def scan(self, text):
+        """Return the set of categories that match anywhere in text."""
+        text_lower = text.lower()
+        hits = set()
+        pos = 0
+        while len(hits) < len(self.categories):
+            m = self.gate.search(text_lower, pos)
+            if not m:
+                break
+            probe = self.probes.match(text_lower, m.start())
+            hits.update(k for k, v in probe.groupdict().items() if v is not None)
+            pos = m.start() + 1
+        return hits
+
+    def scan_many(self, texts):
+        """
+        scan() for a list of texts in one pass: the texts are joined with NUL
+        separators, which no lexicon can match across, and each hit is mapped
+        back to its text by offset.
+        """
+        lowered = [text.lower() for text in texts]
+        joined = "\0".join(lowered)
+        starts = []
+        offset = 0
+        for text in lowered:
+            starts.append(offset)
+            offset += len(text) + 1
+        results = [set() for _ in texts]
+        pos = 0
+        while True:
+            m = self.gate.search(joined, pos)
+            if not m:
+                break
+            i = bisect.bisect_right(starts, m.start()) - 1
+            hits = results[i]
+            probe = self.probes.match(joined, m.start())
+            hits.update(k for k, v in probe.groupdict().items() if v is not None)
+            pos = m.start() + 1
+            if len(hits) == len(self.categories) and i + 1 < len(starts):
+                pos = starts[i + 1]
+        return results
+
+
+moderation_matcher = ModerationMatcher(OFFENSIVE_PATTERNS, PROFANITY_LIST, SEVERE_DISTRESS_KEYWORDS)
+
+
 def detect_severe_distress(text):
     """Check if text contains severe distress signals."""
-    text_lower = text.lower()
-    for keyword in SEVERE_DISTRESS_KEYWORDS:
-        if keyword in text_lower:
-            return True
-    return False
+    return "severe_distress" in moderation_matcher.scan(text)
 
 
 def detect_offensive_language(text):
     """Check if text contains offensive language."""
-    text_lower = text.lower()
-    for pattern in OFFENSIVE_PATTERNS:
-        if re.search(pattern, text_lower, re.IGNORECASE):
-            return True
-    for word in PROFANITY_LIST:
-        if re.search(r"\b" + re.escape(word) + r"\b", text_lower):
-            return True
-    return False
+    hits = moderation_matcher.scan(text)
+    return "offensive" in hits or "profanity" in hits
 
 
 def get_mock_support_options(issue_text, profile_dict):
@@ -977,15 +2657,17 @@ def mock_ai_suggest_resources_and_options(issue_text, profile_dict, followup_cou
     }
 
 
-def mock_ai_moderate_message(message_text):
+def mock_ai_moderate_message(message_text, hits=None):
     """Deterministic mock AI for chat moderation."""
-    if detect_offensive_language(message_text):
+    if hits is None:
+        hits = moderation_matcher.scan(message_text)
+    if "offensive" in hits or "profanity" in hits:
         return {
             "allowed": False,
             "reason": "offensive_language",
             "user_message": "Your message was not sent because it contains inappropriate language."
         }
-    if detect_severe_distress(message_text):
+    if "severe_distress" in hits:
         return {
             "allowed": True,
             "reason": "severe_distress",
@@ -1017,43 +2699,336 @@ def call_live_ai(endpoint, payload):
     return None
 
 
-def call_ai_api(prompt, max_tokens=300):
-    """Call Cerebras AI API for text generation."""
-    if os.environ.get("LIVE_AI") != "1":
-        return None
-
-    api_key = os.environ.get("CEREBRAS_API_KEY")
-    if not api_key:
-        return None
-
-    try:
-        from cerebras.cloud.sdk import Cerebras
-
-        client = Cerebras(api_key=api_key)
+# LLM backend: "cerebras" (default) or "stub", an offline backend that
+# returns canned completions in the shape the prompts ask for (for tests).
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "cerebras")
+LLM_MODEL = os.environ.get("LLM_MODEL", "llama-3.3-70b")
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "30"))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "5"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "1"))
+# Requests beyond this many in flight wait up to LLM_TIMEOUT for a slot,
+# then fall back to the non-AI path
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+# Stream AI responses to the browser as they are generated (/resources)
+LLM_STREAMING = os.environ.get("LLM_STREAMING", "1") == "1"
+
+_llm_client = None
+_llm_client_lock = threading.Lock()
+llm_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+
+class CerebrasLLMClient:
+    """One Cerebras SDK client with a pooled keep-alive HTTP connection, shared by all threads."""
+
+    def __init__(self, api_key):
+        import httpx
+        from cerebras.cloud.sdk import Cerebras, DefaultHttpxClient
+
+        self.client = Cerebras(
+            api_key=api_key,
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            max_retries=LLM_MAX_RETRIES,
+            http_client=DefaultHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONCURRENCY,
+                    max_keepalive_connections=LLM_MAX_CONCURRENCY,
+                    keepalive_expiry=120,
+                ),
+            ),
+        )
 
-        completion = client.chat.completions.create(
+    def complete(self, prompt, max_tokens):
+        completion = self.client.chat.completions.create(
             messages=[{"role": "user", "content": prompt}],
-            model="llama-3.3-70b",
+            model=LLM_MODEL,
             max_completion_tokens=max_tokens,
             temperature=0.7,
             top_p=1,
             stream=False
         )
+        return completion.choices[0].message.content
+
+    def stream(self, prompt, max_tokens):
+        """Yield the completion text in pieces as they arrive."""
+        chunks = self.client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=LLM_MODEL,
+            max_completion_tokens=max_tokens,
+            temperature=0.7,
+            top_p=1,
+            stream=True
+        )
+        try:
+            for chunk in chunks:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            chunks.close()
+
+    def close(self):
+        self.client.close()
+
+
+class StubLLMClient:
+    """Offline backend: deterministic completions, and a record of the prompts it saw."""
+
+    def __init__(self):
+        self.prompts = []
+
+    def complete(self, prompt, max_tokens):
+        self.prompts.append(prompt)
+        if "SUGGESTIONS:" in prompt:
+            return (
+                "MESSAGE: It sounds like you are carrying a lot right now, and that is okay.\n\n"
+                "SUGGESTIONS:\n"
+                "1. Write down the one thing weighing on you most today\n"
+                "2. Reach out to a peer support group on campus\n"
+                "3. Book a drop-in session with ASU Counseling Services\n"
+                "4. Keep a regular sleep schedule this week\n"
+                "5. Plan one small social activity\n\n"
+                "RESOURCES: 1, 2, 3"
+            )
+        return "Answer: A good first step is to visit ASU Counseling Services, which offers same-day appointments."
+
+    def stream(self, prompt, max_tokens):
+        text = self.complete(prompt, max_tokens)
+        for start in range(0, len(text), 7):
+            yield text[start:start + 7]
+
+    def close(self):
+        pass
+
+
+def get_llm_client():
+    """Process-wide LLM client, created on first use. None if not configured."""
+    global _llm_client
+    if _llm_client is None:
+        with _llm_client_lock:
+            if _llm_client is None:
+                if LLM_BACKEND == "stub":
+                    _llm_client = StubLLMClient()
+                else:
+                    api_key = os.environ.get("CEREBRAS_API_KEY")
+                    if not api_key:
+                        return None
+                    _llm_client = CerebrasLLMClient(api_key)
+    return _llm_client
+
+
+def close_llm_client():
+    """Close the shared client's connections; the next call creates a new one."""
+    global _llm_client
+    with _llm_client_lock:
+        client, _llm_client = _llm_client, None
+    if client is not None:
+        client.close()
+
+
+atexit.register(close_llm_client)
+
+
+# Profiling guard: LLM calls are counted per request, and a route that makes
+# one without being marked @consumes_llm_output is reported (its output is
+# being thrown away). Set LLM_CALL_GUARD=0 to disable. The counter lives in
+# a ContextVar rather than on g so calls made from executor workers (run in
+# a copy of the request's context) and from streamed response bodies (run
+# after the request context is gone) are still counted.
+LLM_CALL_GUARD = os.environ.get("LLM_CALL_GUARD", "1") == "1"
+llm_discarded_calls = {}  # endpoint -> LLM calls whose output the route discarded
+llm_discarded_calls_lock = threading.Lock()
+llm_call_count = contextvars.ContextVar("llm_call_count", default=None)  # [calls] for this request
+
+
+def consumes_llm_output(f):
+    """Decorator marking a route that uses the LLM output it requests."""
+    f.consumes_llm_output = True
+    return f
+
+
+def note_llm_call():
+    """Count an LLM call against the current request for the profiling guard."""
+    counter = llm_call_count.get()
+    if counter is not None:
+        with llm_discarded_calls_lock:
+            counter[0] += 1
+
+
+def report_discarded_llm_calls(endpoint, calls):
+    if calls:
+        with llm_discarded_calls_lock:
+            llm_discarded_calls[endpoint] = llm_discarded_calls.get(endpoint, 0) + calls
+        print(f"LLM guard: {endpoint} made {calls} LLM call(s) and discarded the output")
+
+
+def count_streamed_llm_calls(chunks, ctx, counter, endpoint):
+    """Iterate a streamed body inside the request's context, then report its LLM calls."""
+    iterator = iter(chunks)
+    try:
+        while True:
+            try:
+                chunk = ctx.run(next, iterator)
+            except StopIteration:
+                break
+            yield chunk
+    finally:
+        if hasattr(iterator, "close"):
+            ctx.run(iterator.close)
+        report_discarded_llm_calls(endpoint, counter[0])
+
+
+@app.before_request
+def start_llm_call_count():
+    if LLM_CALL_GUARD:
+        llm_call_count.set([0])
+
+
+@app.after_request
+def flag_discarded_llm_calls(response):
+    """Report routes that called the LLM without consuming the output."""
+    counter = llm_call_count.get()
+    view = app.view_functions.get(request.endpoint)
+    if counter is None or getattr(view, "consumes_llm_output", False):
+        return response
+    if response.is_streamed:
+        # The body has not run yet; count the calls it makes as it streams
+        response.response = count_streamed_llm_calls(
+            response.response, contextvars.copy_context(), counter, request.endpoint
+        )
+    else:
+        report_discarded_llm_calls(request.endpoint, counter[0])
+    return response
+
+
+def call_ai_api(prompt, max_tokens=300):
+    """Call Cerebras AI API for text generation."""
+    if os.environ.get("LIVE_AI") != "1":
+        return None
+
+    try:
+        client = get_llm_client()
+        if client is None:
+            return None
+
+        note_llm_call()
+        if not llm_slots.acquire(timeout=LLM_TIMEOUT):
+            print("Cerebras API error: too many concurrent requests")
+            return None
+        try:
+            content = client.complete(prompt, max_tokens)
+        finally:
+            llm_slots.release()
 
-        return completion.choices[0].message.content.strip()
+        return content.strip()
     except Exception as e:
         print(f"Cerebras API error: {e}")
         return None
 
 
+def call_ai_api_stream(prompt, max_tokens=300):
+    """Streaming call_ai_api: yields text pieces as the completion arrives (nothing if unavailable)."""
+    if os.environ.get("LIVE_AI") != "1":
+        return
+
+    try:
+        client = get_llm_client()
+        if client is None:
+            return
+
+        note_llm_call()
+        if not llm_slots.acquire(timeout=LLM_TIMEOUT):
+            print("Cerebras API error: too many concurrent requests")
+            return
+        try:
+            yield from client.stream(prompt, max_tokens)
+        finally:
+            llm_slots.release()
+    except Exception as e:
+        print(f"Cerebras API error: {e}")
 
 
 
 
-def generate_support_response(issue_text, profile_dict):
-    """Generate personalized support response with empathetic message, suggestions, and relevant resources."""
-    profile_summary = build_profile_text(profile_dict)
-    
+
+
+# Parsed generate_support_response results, keyed by
+# sha256(prompt version, issue text, profile text) with a TTL. Bump
+# SUPPORT_PROMPT_VERSION whenever the prompt changes. Set SUPPORT_CACHE_DB
+# to a SQLite path to write entries through to disk so they survive restarts.
+SUPPORT_PROMPT_VERSION = "1"
+SUPPORT_CACHE_SIZE = int(os.environ.get("SUPPORT_CACHE_SIZE", "512"))
+SUPPORT_CACHE_TTL = float(os.environ.get("SUPPORT_CACHE_TTL", "3600"))
+SUPPORT_CACHE_DB = os.environ.get("SUPPORT_CACHE_DB", "")
+support_response_cache = OrderedDict()  # key -> (expires_at, response)
+support_response_cache_lock = threading.Lock()
+_support_cache_db = None
+
+
+def support_cache_key(*parts):
+    """Hash the inputs that determine a response (e.g. issue text and profile text)."""
+    payload = json.dumps([SUPPORT_PROMPT_VERSION, *parts])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_support_cache_db():
+    """SQLite connection backing the support cache, or None if persistence is off."""
+    global _support_cache_db
+    if SUPPORT_CACHE_DB and _support_cache_db is None:
+        db = sqlite3.connect(SUPPORT_CACHE_DB, check_same_thread=False)
+        db.execute('''
+            CREATE TABLE IF NOT EXISTS support_response_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        db.commit()
+        _support_cache_db = db
+    return _support_cache_db
+
+
+def get_cached_support_response(key):
+    """Return a copy of an unexpired cached response, or None."""
+    now = time.time()
+    with support_response_cache_lock:
+        entry = support_response_cache.get(key)
+        if entry is None:
+            db = get_support_cache_db()
+            if db is not None:
+                row = db.execute(
+                    'SELECT response, expires_at FROM support_response_cache WHERE key = ?', (key,)
+                ).fetchone()
+                if row:
+                    entry = (row[1], json.loads(row[0]))
+                    support_response_cache[key] = entry
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            del support_response_cache[key]
+            return None
+        support_response_cache.move_to_end(key)
+        return copy.deepcopy(entry[1])
+
+
+def cache_support_response(key, response):
+    """Store a response in the LRU cache (and on disk when enabled)."""
+    expires_at = time.time() + SUPPORT_CACHE_TTL
+    with support_response_cache_lock:
+        support_response_cache[key] = (expires_at, copy.deepcopy(response))
+        support_response_cache.move_to_end(key)
+        while len(support_response_cache) > SUPPORT_CACHE_SIZE:
+            support_response_cache.popitem(last=False)
+        db = get_support_cache_db()
+        if db is not None:
+            db.execute(
+                'INSERT OR REPLACE INTO support_response_cache (key, response, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(response), expires_at),
+            )
+            db.execute('DELETE FROM support_response_cache WHERE expires_at <= ?', (time.time(),))
+            db.commit()
+
+
+def build_support_prompt(issue_text, profile_summary):
+    """Prompt for generate_support_response; bump SUPPORT_PROMPT_VERSION when it changes."""
     # Format available resources for the prompt
     resources_list = "\n".join([f"{i+1}. {r['name']}" for i, r in enumerate(ASU_RESOURCES)])
 
@@ -1082,65 +3057,181 @@ SUGGESTIONS:
 5. [Fifth suggestion]
 
 RESOURCES: [comma separated numbers, e.g. 1, 5, 8]"""
+    return prompt
 
-    response = call_ai_api(prompt, max_tokens=500)
 
-    if response:
-        # Parse message, suggestions, and resources
-        empathetic_message = ""
-        suggestions = []
-        resource_indices = []
-        
-        # Extract Message
-        if "MESSAGE:" in response:
-            parts = response.split("SUGGESTIONS:")
-            if len(parts) >= 2:
-                empathetic_message = parts[0].replace("MESSAGE:", "").strip()
-                remaining = parts[1]
-                
-                # Extract Suggestions and Resources
-                if "RESOURCES:" in remaining:
-                    sugg_parts = remaining.split("RESOURCES:")
-                    suggestion_text = sugg_parts[0]
-                    resource_text = sugg_parts[1].strip()
-                    
-                    # Parse Suggestions
-                    lines = suggestion_text.split('\n')
-                    for line in lines:
-                        line = line.strip()
-                        if line and len(line) > 3:
-                            if line[0].isdigit() and '.' in line[:3]:
-                                line = line.split('.', 1)[1].strip()
-                            if line:
-                                suggestions.append(line)
-
-                    # Parse Resource Indices
-                    try:
-                        # Extract numbers using regex to handle various formats
-                        import re
-                        numbers = re.findall(r'\d+', resource_text)
-                        resource_indices = [int(n) - 1 for n in numbers if n.isdigit()] # Convert 1-based to 0-based
-                        # Filter valid indices
-                        resource_indices = [idx for idx in resource_indices if 0 <= idx < len(ASU_RESOURCES)]
-                    except Exception:
-                        pass
-        
-        if empathetic_message or suggestions:
+class SupportResponseParser:
+    """
+    Incremental parser for the MESSAGE: / SUGGESTIONS: / RESOURCES: reply
+    format. feed() takes completion text as it streams in and returns the
+    events that became known:
+
+      ("message_delta", text)  more of the empathetic message
+      ("message", text)        the complete message, once SUGGESTIONS: is seen
+      ("suggestion", text)     each suggestion, once its line ends
+      ("resources", [i, ...])  0-based ASU_RESOURCES indices, from finish()
+
+    result() returns the dict generate_support_response returns, or None.
+    """
+
+    def __init__(self):
+        self.text = ""  # whole completion so far
+        self.section = "message"  # message -> suggestions -> resources -> done
+        self.buffer = ""  # unparsed text of the current section
+        self.message = ""
+        self.message_sent = 0  # length of the message already emitted as deltas
+        self.suggestions = []
+        self.resources_seen = False
+        self.resource_indices = []
+
+    def feed(self, delta):
+        self.text += delta
+        self.buffer += delta
+        return self._parse(final=False)
+
+    def finish(self):
+        """Parse whatever is left once the completion has ended."""
+        return self._parse(final=True)
+
+    def _message_delta(self, raw, events):
+        cleaned = raw.replace("MESSAGE:", "").lstrip()
+        if len(cleaned) > self.message_sent:
+            events.append(("message_delta", cleaned[self.message_sent:]))
+            self.message_sent = len(cleaned)
+
+    def _suggestion_lines(self, text, events):
+        for line in text.split("\n"):
+            line = line.strip()
+            if line and len(line) > 3:
+                if line[0].isdigit() and "." in line[:3]:
+                    line = line.split(".", 1)[1].strip()
+                if line:
+                    self.suggestions.append(line)
+                    events.append(("suggestion", line))
+
+    def _parse(self, final):
+        events = []
+
+        if self.section == "message":
+            end = self.buffer.find("SUGGESTIONS:")
+            if end == -1:
+                # Hold back anything that could be the start of a delimiter
+                cut = len(self.buffer) if final else len(self.buffer) - len("SUGGESTIONS:") + 1
+                raw = self.buffer[:max(cut, 0)]
+                for k in range(len("MESSAGE:") - 1, 0, -1):
+                    if not final and raw.endswith("MESSAGE:"[:k]):
+                        raw = raw[:-k]
+                        break
+                self._message_delta(raw, events)
+                return events
+            self._message_delta(self.buffer[:end], events)
+            self.message = self.buffer[:end].replace("MESSAGE:", "").strip()
+            events.append(("message", self.message))
+            self.buffer = self.buffer[end + len("SUGGESTIONS:"):]
+            self.section = "suggestions"
+
+        if self.section == "suggestions":
+            ends = [i for i in (self.buffer.find("RESOURCES:"), self.buffer.find("SUGGESTIONS:")) if i != -1]
+            if ends:
+                end = min(ends)
+                self._suggestion_lines(self.buffer[:end], events)
+                if self.buffer.startswith("RESOURCES:", end):
+                    self.resources_seen = True
+                    self.buffer = self.buffer[end + len("RESOURCES:"):]
+                    self.section = "resources"
+                else:
+                    # A second SUGGESTIONS: ends the reply
+                    self.buffer = ""
+                    self.section = "done"
+            elif final:
+                self._suggestion_lines(self.buffer, events)
+                self.buffer = ""
+            else:
+                last_line_end = self.buffer.rfind("\n")
+                if last_line_end != -1:
+                    self._suggestion_lines(self.buffer[:last_line_end], events)
+                    self.buffer = self.buffer[last_line_end + 1:]
+
+        if self.section == "resources" and final:
+            resource_text = self.buffer
+            for delimiter in ("RESOURCES:", "SUGGESTIONS:"):
+                resource_text = resource_text.split(delimiter)[0]
+            # Resources are listed 1-based in the prompt
+            numbers = re.findall(r'\d+', resource_text)
+            resource_indices = [int(n) - 1 for n in numbers if n.isdigit()]
+            self.resource_indices = [idx for idx in resource_indices if 0 <= idx < len(ASU_RESOURCES)]
+            self.buffer = ""
+            self.section = "done"
+            events.append(("resources", self.resource_indices))
+
+        return events
+
+    def result(self):
+        if "MESSAGE:" not in self.text or self.section == "message":
+            return None
+        # Suggestions only count when the reply got as far as RESOURCES:
+        suggestions = self.suggestions if self.resources_seen else []
+        if self.message or suggestions:
             return {
-                "message": empathetic_message,
-                "suggestions": suggestions[:5] if suggestions else [],
-                "resource_indices": resource_indices
+                "message": self.message,
+                "suggestions": suggestions[:5],
+                "resource_indices": self.resource_indices
             }
+        return None
 
-    return None
 
+def generate_support_response(issue_text, profile_dict):
+    """Generate personalized support response with empathetic message, suggestions, and relevant resources."""
+    profile_summary = build_profile_text(profile_dict)
+    cache_key = support_cache_key(issue_text, profile_summary)
+    cached = get_cached_support_response(cache_key)
+    if cached is not None:
+        return cached
 
+    response = call_ai_api(build_support_prompt(issue_text, profile_summary), max_tokens=500)
 
+    if response:
+        parser = SupportResponseParser()
+        parser.feed(response)
+        parser.finish()
+        result = parser.result()
+        if result:
+            cache_support_response(cache_key, result)
+            return result
 
-def generate_followup_answer(issue_text, followup_question, profile_dict, history=None):
-    """Generate answer to a follow-up question using AI."""
+    return None
+
+
+def stream_support_response(issue_text, profile_dict):
+    """
+    Streaming generate_support_response: yields SupportResponseParser events
+    as the completion arrives, then ("result", dict or None). Results are
+    cached exactly like the blocking call.
+    """
     profile_summary = build_profile_text(profile_dict)
+    cache_key = support_cache_key(issue_text, profile_summary)
+    cached = get_cached_support_response(cache_key)
+    if cached is not None:
+        yield ("message", cached["message"])
+        for suggestion in cached["suggestions"]:
+            yield ("suggestion", suggestion)
+        yield ("resources", cached["resource_indices"])
+        yield ("result", cached)
+        return
+
+    parser = SupportResponseParser()
+    for delta in call_ai_api_stream(build_support_prompt(issue_text, profile_summary), max_tokens=500):
+        yield from parser.feed(delta)
+    yield from parser.finish()
+
+    result = parser.result()
+    if result:
+        cache_support_response(cache_key, result)
+    yield ("result", result)
 
+
+def build_followup_prompt(issue_text, followup_question, profile_summary, history=None):
+    """Prompt for generate_followup_answer."""
     history_text = ""
     if history:
         history_text = "\n\nPrevious Q&A:\n"
@@ -1157,28 +3248,88 @@ Current Question: {followup_question}
 Provide a helpful, specific answer to the student's question. Be warm, practical, and reference ASU resources when relevant. Keep your response to 2-3 sentences.
 
 Answer:"""
+    return prompt
+
+
+def clean_followup_answer(text):
+    """Drop leading whitespace and an echoed "Answer:" label."""
+    text = text.lstrip()
+    if text.startswith("Answer:"):
+        text = text[7:].lstrip()
+    return text
+
+
+def generate_followup_answer(issue_text, followup_question, profile_dict, history=None):
+    """Generate answer to a follow-up question using AI."""
+    profile_summary = build_profile_text(profile_dict)
+    prompt = build_followup_prompt(issue_text, followup_question, profile_summary, history)
+    cache_key = support_cache_key("followup", prompt)
+    cached = get_cached_support_response(cache_key)
+    if cached is not None:
+        return cached
 
     response = call_ai_api(prompt, max_tokens=150)
 
     if response:
-        # Clean up the response
-        answer = response.strip()
-        if answer.startswith("Answer:"):
-            answer = answer[7:].strip()
+        answer = clean_followup_answer(response).rstrip()
         if answer:
+            cache_support_response(cache_key, answer)
             return answer
 
     return None
 
 
-def ai_suggest_resources_and_options(issue_text, profile_dict, followup_count, followup_question=None):
-    """AI abstraction for resource suggestions. Falls back to mock if live AI unavailable."""
+def stream_followup_answer(issue_text, followup_question, profile_dict, history=None):
+    """
+    Streaming generate_followup_answer: yields pieces of the answer as they
+    arrive. The finished answer is cached, so a following
+    generate_followup_answer call with the same inputs returns it at once.
+    """
+    profile_summary = build_profile_text(profile_dict)
+    prompt = build_followup_prompt(issue_text, followup_question, profile_summary, history)
+    cache_key = support_cache_key("followup", prompt)
+    cached = get_cached_support_response(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    text = ""
+    sent = 0
+    for delta in call_ai_api_stream(prompt, max_tokens=150):
+        text += delta
+        head = text.lstrip()
+        if len(head) < len("Answer:") and "Answer:".startswith(head):
+            continue  # could still be the label
+        answer = clean_followup_answer(text)
+        if len(answer) > sent:
+            yield answer[sent:]
+            sent = len(answer)
+
+    answer = clean_followup_answer(text).rstrip()
+    if answer:
+        cache_support_response(cache_key, answer)
+
+
+def ai_recommend_groups(issue_text, profile_dict):
+    """
+    Recommendation-only path: group recommendations for an issue without
+    the resource/LLM work of ai_suggest_resources_and_options.
+    """
+    return get_mock_recommended_groups(issue_text, profile_dict)
+
+
+def ai_suggest_resources_and_options(issue_text, profile_dict, followup_count, followup_question=None, live=True,
+                                     ai_response=None):
+    """
+    AI abstraction for resource suggestions. Falls back to mock if live AI
+    unavailable; live=False skips the AI call (the page streams it instead).
+    Pass ai_response to build the result from an already-fetched response.
+    """
     # Try to get AI-generated response
-    ai_response = None
     empathetic_message = ""
     support_options = []
 
-    if os.environ.get("LIVE_AI") == "1":
+    if ai_response is None and live and os.environ.get("LIVE_AI") == "1":
         ai_response = generate_support_response(issue_text, profile_dict)
 
     if ai_response:
@@ -1207,7 +3358,7 @@ def ai_suggest_resources_and_options(issue_text, profile_dict, followup_count, f
         support_options = get_mock_support_options(issue_text, profile_dict)
 
     # Get recommended groups
-    recommended_groups = get_mock_recommended_groups(issue_text, profile_dict)
+    recommended_groups = ai_recommend_groups(issue_text, profile_dict)
 
     disclaimer = (
 
@@ -1225,6 +3376,13 @@ def ai_suggest_resources_and_options(issue_text, profile_dict, followup_count, f
 
 
 
+# Fallback response
+FOLLOWUP_FALLBACK_ANSWER = (
+    "Based on your question, consider exploring the resources listed above. "
+    "Start with the option that feels most relevant to your situation."
+)
+
+
 def ai_generate_followup_response(issue_text, followup_question, profile_dict, history=None):
     """Generate a response to a follow-up question."""
     if os.environ.get("LIVE_AI") == "1":
@@ -1232,9 +3390,7 @@ def ai_generate_followup_response(issue_text, followup_question, profile_dict, h
         if ai_response:
             return ai_response
 
-    # Fallback response
-    return ("Based on your question, consider exploring the resources listed above. "
-            "Start with the option that feels most relevant to your situation.")
+    return FOLLOWUP_FALLBACK_ANSWER
 
 
 def ai_moderate_message(message_text):
@@ -1248,6 +3404,165 @@ def ai_moderate_message(message_text):
     return mock_ai_moderate_message(message_text)
 
 
+# Optimistic moderation for chat: the lexicon verdict is applied inline and
+# the live moderator reviews allowed messages on a background pool, where it
+# can retract (delete) or flag them after they are posted. Set
+# MODERATION_MODE=blocking to wait for the live verdict before posting.
+MODERATION_MODE = os.environ.get("MODERATION_MODE", "optimistic")
+MODERATION_WORKERS = int(os.environ.get("MODERATION_WORKERS", "4"))
+_moderation_executor = None
+_moderation_executor_lock = threading.Lock()
+
+
+def get_moderation_executor():
+    """Thread pool for background message reviews."""
+    global _moderation_executor
+    if _moderation_executor is None:
+        with _moderation_executor_lock:
+            if _moderation_executor is None:
+                _moderation_executor = ThreadPoolExecutor(
+                    max_workers=MODERATION_WORKERS, thread_name_prefix="moderate"
+                )
+    return _moderation_executor
+
+
+def moderate_chat_message(message_text):
+    """
+    Moderate a chat message before posting. Returns (verdict, deferred);
+    when deferred is True the caller should post the message and then
+    call schedule_message_review for it.
+    """
+    if MODERATION_MODE != "optimistic" or os.environ.get("LIVE_AI") != "1":
+        return ai_moderate_message(message_text), False
+    verdict = mock_ai_moderate_message(message_text)
+    return verdict, verdict["allowed"]
+
+
+def review_message(group_name, msg_id, text):
+    """Ask the live moderator about a posted message and retract or flag it."""
+    result = call_live_ai("moderate", {"message_text": text})
+    room = groups.get(group_name)
+    if not result or room is None:
+        return
+    with room.lock:
+        msg = room.get(msg_id)
+        if not msg or msg.get("text") != text:
+            return  # deleted or edited since; the edit has its own review
+        if not result.get("allowed", True):
+            room.delete(msg_id)
+            print(f"Moderation retracted message {msg_id} in {group_name}: {result.get('reason')}")
+        elif result.get("reason") == "severe_distress" and not msg.get("flagged"):
+            room.update(msg_id, flagged="severe_distress")
+
+
+def schedule_message_review(group_name, msg_id, text):
+    get_moderation_executor().submit(review_message, group_name, msg_id, text)
+
+
+# /api/moderate/batch can reach the remote moderation model, so requests are
+# capped at MODERATION_BATCH_LIMIT texts and each user at MODERATION_RATE_LIMIT
+# texts per minute.
+MODERATION_BATCH_LIMIT = int(os.environ.get("MODERATION_BATCH_LIMIT", "50"))
+MODERATION_RATE_LIMIT = int(os.environ.get("MODERATION_RATE_LIMIT", "200"))
+moderation_usage = {}  # { user_id: (window_start, texts moderated in that minute) }
+moderation_usage_lock = threading.Lock()
+
+
+def take_moderation_quota(user_id, count):
+    """Charge count texts to a user's per-minute budget; False if that would exceed it."""
+    now = time.monotonic()
+    with moderation_usage_lock:
+        start, used = moderation_usage.get(user_id, (now, 0))
+        if now - start >= 60:
+            start, used = now, 0
+        if used + count > MODERATION_RATE_LIMIT:
+            return False
+        moderation_usage[user_id] = (start, used + count)
+        if len(moderation_usage) > 10000:
+            for uid, (window_start, _) in list(moderation_usage.items()):
+                if now - window_start >= 60:
+                    del moderation_usage[uid]
+        return True
+
+
+def ai_moderate_messages(texts):
+    """
+    Moderate many texts at once; returns one verdict per input, in order.
+
+    Identical texts are moderated once. The lexicon pass runs over all of
+    them together and its blocks are final. In live mode the remaining
+    texts go to the remote moderator in a single "moderate_batch" call
+    ({"messages": [...]} -> {"results": [verdict, ...]}); any text it does
+    not return a verdict for keeps the local one.
+    """
+    unique = list(dict.fromkeys(texts))
+    all_hits = moderation_matcher.scan_many(unique)
+    verdicts = {
+        text: mock_ai_moderate_message(text, hits)
+        for text, hits in zip(unique, all_hits)
+    }
+
+    undecided = [text for text in unique if verdicts[text]["allowed"]]
+    if undecided and os.environ.get("LIVE_AI") == "1":
+        result = call_live_ai("moderate_batch", {"messages": undecided})
+        remote = result.get("results") if isinstance(result, dict) else None
+        if isinstance(remote, list) and len(remote) == len(undecided):
+            for text, verdict in zip(undecided, remote):
+                if isinstance(verdict, dict) and "allowed" in verdict:
+                    verdicts[text] = verdict
+
+    return [verdicts[text] for text in texts]
+
+
+def rescan_room_history(group_name, batch_size=200):
+    """
+    Re-moderate every message in a room, newest first, and delete the ones
+    that are no longer allowed (e.g. after a lexicon update). Legacy
+    messages without an id cannot be deleted and are skipped. Returns the
+    ids of the removed messages.
+    """
+    room = groups.get(group_name)
+    if room is None:
+        return []
+
+    flagged = []
+    seen = set()
+    page = room.history(limit=batch_size)
+    while page:
+        user_messages = [msg for _, msg in page if msg.get("id") is not None and not msg.get("is_system")]
+        verdicts = ai_moderate_messages([msg.get("text", "") for msg in user_messages])
+        for msg, verdict in zip(user_messages, verdicts):
+            if not verdict["allowed"] and msg["id"] not in seen:
+                seen.add(msg["id"])
+                flagged.append(msg["id"])
+        # Page back by position so pages without ids do not end the scan
+        page = room.history(before=page[0][0], limit=batch_size)
+
+    for msg_id in flagged:
+        room.delete(msg_id)
+    return flagged
+
+
+# Set MODERATION_RESCAN_ON_START=1 to re-moderate every room's history in the
+# background at startup, e.g. after the moderation lexicon was updated.
+MODERATION_RESCAN_ON_START = os.environ.get("MODERATION_RESCAN_ON_START", "0") == "1"
+
+
+def rescan_all_rooms():
+    """Rescan every room's history; returns {group_name: [removed ids]} for rooms that changed."""
+    removed = {}
+    for group_name in list(groups):
+        try:
+            ids = rescan_room_history(group_name)
+        except Exception as e:
+            print(f"Moderation rescan error in {group_name}: {e}")
+            continue
+        if ids:
+            print(f"Moderation rescan removed {len(ids)} message(s) from {group_name}")
+            removed[group_name] = ids
+    return removed
+
+
 # -----------------------------------------------------------------------------
 # Helper Functions
 # -----------------------------------------------------------------------------
@@ -1271,11 +3586,7 @@ def get_profile_dict():
 
 def check_profanity(text):
     """Basic profanity check for group topic validation."""
-    text_lower = text.lower()
-    for word in PROFANITY_LIST:
-        if word in text_lower:
-            return True
-    return False
+    return "profanity_substr" in moderation_matcher.scan(text)
 
 
 def find_relevant_group(topic_text):
@@ -1347,12 +3658,12 @@ def login():
                     session["display_name"] = profile["display_name"]
                     session["gender"] = profile.get("gender", "")
                     session["preferred_language"] = profile["preferred_language"]
-                    session["primary_challenge"] = profile["primary_challenge"]
+                    session["primary_challenge"] = list(profile["primary_challenge"])
                     session["support_style"] = profile["support_style"]
-                    session["support_topics"] = profile.get("support_topics", [])
-                    session["private_topics"] = profile.get("private_topics", [])
-                    session["languages"] = profile.get("languages", [])
-                    session["cultural_background"] = profile.get("cultural_background", [])
+                    session["support_topics"] = list(profile.get("support_topics", []))
+                    session["private_topics"] = list(profile.get("private_topics", []))
+                    session["languages"] = list(profile.get("languages", []))
+                    session["cultural_background"] = list(profile.get("cultural_background", []))
                     session["onboarding_complete"] = profile.get("onboarding_complete", False)
                     
                     # Redirect based on onboarding status
@@ -1517,8 +3828,8 @@ def onboarding_submit():
     session["cultural_background"] = cultural_background
     session["onboarding_complete"] = True
     
-    # Store user embedding for semantic matching
-    store_user_embedding(user_id, profile_dict)
+    # Refresh user embedding for semantic matching in the background
+    schedule_user_embedding(user_id, profile_dict)
     
     return redirect(url_for("decision"))
 
@@ -1582,8 +3893,7 @@ def profile():
         # Save to database
         if user_id:
             save_profile_to_db(user_id, profile_dict)
-            store_user_embedding(user_id, profile_dict)
-            cache_user_profile(user_id, display_name, profile_dict)
+            schedule_user_embedding(user_id, profile_dict)
         
         flash("Profile saved successfully!", "success")
         return redirect(url_for("profile"))
@@ -1633,8 +3943,72 @@ def issue():
     )
 
 
+# Recommendation fan-out for /resources: the AI support response, semantic
+# group matches and the follow-up answer are independent, so they run in
+# parallel. Each source has its own deadline, capped by the overall page
+# budget; a source that misses it (or fails) is replaced by its mock or
+# keyword fallback. A late AI response still lands in the support cache.
+RECOMMEND_WORKERS = int(os.environ.get("RECOMMEND_WORKERS", "8"))
+RESOURCES_PAGE_BUDGET = float(os.environ.get("RESOURCES_PAGE_BUDGET", "20"))
+SUPPORT_SOURCE_DEADLINE = float(os.environ.get("SUPPORT_SOURCE_DEADLINE", "15"))
+SEMANTIC_SOURCE_DEADLINE = float(os.environ.get("SEMANTIC_SOURCE_DEADLINE", "2"))
+FOLLOWUP_SOURCE_DEADLINE = float(os.environ.get("FOLLOWUP_SOURCE_DEADLINE", "15"))
+_recommend_executor = None
+_recommend_executor_lock = threading.Lock()
+
+
+def get_recommend_executor():
+    """Thread pool for the /resources recommendation sources."""
+    global _recommend_executor
+    if _recommend_executor is None:
+        with _recommend_executor_lock:
+            if _recommend_executor is None:
+                _recommend_executor = ThreadPoolExecutor(
+                    max_workers=RECOMMEND_WORKERS, thread_name_prefix="recommend"
+                )
+    return _recommend_executor
+
+
+def gather_recommendation_sources(sources, budget=None):
+    """
+    Run sources concurrently and return {name: result}.
+
+    sources maps name -> (fn, deadline, fallback). Deadlines count from the
+    start of the call and are capped at budget (RESOURCES_PAGE_BUDGET by
+    default); a source that raises or is still running by then gets
+    fallback() instead, so the call takes as long as the slowest source.
+    """
+    if budget is None:
+        budget = RESOURCES_PAGE_BUDGET
+    start = time.monotonic()
+    executor = get_recommend_executor()
+
+    futures = {}
+    for name, (fn, _, _) in sources.items():
+        if has_request_context():
+            fn = copy_current_request_context(fn)
+        # Run in a copy of this context so the LLM call guard sees the calls
+        futures[name] = executor.submit(contextvars.copy_context().run, fn)
+
+    results = {}
+    for name, (_, deadline, fallback) in sources.items():
+        future = futures[name]
+        remaining = start + min(deadline, budget) - time.monotonic()
+        try:
+            results[name] = future.result(timeout=max(0.0, remaining))
+        except FutureTimeoutError:
+            future.cancel()
+            print(f"Recommendation source {name} missed its deadline; using fallback")
+            results[name] = fallback()
+        except Exception as e:
+            print(f"Recommendation source {name} failed: {e}")
+            results[name] = fallback()
+    return results
+
+
 @app.route("/resources", methods=["GET", "POST"])
 @login_required
+@consumes_llm_output
 def resources():
     """Resource page with AI suggestions and follow-up Q and A."""
     if not session.get("display_name"):
@@ -1653,33 +4027,61 @@ def resources():
     followup_response = None
 
     if request.method == "POST":
-        followup_question = request.form.get("followup_question", "").strip()
+        followup_question = request.form.get("followup_question", "").strip() or None
         if followup_question:
             session["followup_count"] = followup_count + 1
             followup_count = session["followup_count"]
 
-            # Generate AI response
-            profile_dict = get_profile_dict()
-            history = session.get("followup_history", [])
-            followup_response = ai_generate_followup_response(
-                issue_text, followup_question, profile_dict, history
-            )
-
-            # Store in history
-            history.append({
-                "question": followup_question,
-                "answer": followup_response
-            })
-            session["followup_history"] = history
-
+    user_id = session.get("user_id")
     profile_dict = get_profile_dict()
-    ai_result = ai_suggest_resources_and_options(issue_text, profile_dict, followup_count, followup_question)
+    history = list(session.get("followup_history", []))
+    # Without a cached response, render the page right away and let the
+    # browser stream the AI section from resources_stream
+    stream_support = (
+        LLM_STREAMING
+        and os.environ.get("LIVE_AI") == "1"
+        and get_cached_support_response(
+            support_cache_key(issue_text, build_profile_text(profile_dict))
+        ) is None
+    )
 
-    # Get semantically ranked groups
-    user_id = session.get("user_id")
-    semantic_groups = []
-    if user_id:
-        semantic_groups = get_recommended_groups_semantic(user_id, top_n=5)
+    # Fan out the independent sources; each falls back to mock/keyword results
+    sources = {
+        "support": (
+            lambda: ai_suggest_resources_and_options(
+                issue_text, profile_dict, followup_count, followup_question, live=not stream_support
+            ),
+            SUPPORT_SOURCE_DEADLINE,
+            lambda: ai_suggest_resources_and_options(
+                issue_text, profile_dict, followup_count, followup_question, live=False
+            ),
+        ),
+        "semantic": (
+            lambda: get_recommended_groups_semantic(user_id, top_n=5) if user_id else [],
+            SEMANTIC_SOURCE_DEADLINE,
+            list,
+        ),
+    }
+    if followup_question:
+        sources["followup"] = (
+            lambda prior=list(history): ai_generate_followup_response(
+                issue_text, followup_question, profile_dict, prior
+            ),
+            FOLLOWUP_SOURCE_DEADLINE,
+            lambda: FOLLOWUP_FALLBACK_ANSWER,
+        )
+    results = gather_recommendation_sources(sources)
+    ai_result = results["support"]
+    semantic_groups = results["semantic"]
+
+    if followup_question:
+        # Store in history
+        followup_response = results["followup"]
+        history.append({
+            "question": followup_question,
+            "answer": followup_response
+        })
+        session["followup_history"] = history
 
     # Combine AI-recommended and semantic groups
     ai_groups = ai_result.get("recommended_groups", [])
@@ -1702,11 +4104,91 @@ def resources():
         followup_question=followup_question,
         followup_response=followup_response,
         followup_history=session.get("followup_history", [])[:-1] if followup_question else session.get("followup_history", []),
+        stream_support=stream_support,
         username=session.get("username")
 
     )
 
 
+def sse_event(event, data):
+    """Format one Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route("/resources/stream", methods=["GET"])
+@login_required
+@consumes_llm_output
+def resources_stream():
+    """
+    Server-Sent Events feed of the AI support response for /resources:
+    message_delta, message and suggestion events as the completion
+    arrives, then a final "done" event with the same empathetic message,
+    support options and ASU resources the page would have rendered.
+    """
+    issue_text = session.get("current_issue", "")
+    if not issue_text:
+        return "", 204
+
+    profile_dict = get_profile_dict()
+    followup_count = session.get("followup_count", 0)
+
+    def events():
+        streamed = None
+        for event, data in stream_support_response(issue_text, profile_dict):
+            if event == "result":
+                streamed = data
+            elif event in ("message_delta", "message", "suggestion"):
+                yield sse_event(event, {"text": data})
+        # Build "done" from the streamed result; if the stream failed, fall
+        # back to the mock rather than making a second, blocking LLM call
+        ai_result = ai_suggest_resources_and_options(
+            issue_text, profile_dict, followup_count, live=False, ai_response=streamed or None
+        )
+        yield sse_event("done", {
+            "empathetic_message": ai_result["empathetic_message"],
+            "support_options": ai_result["support_options"],
+            "asu_resources": ai_result["asu_resources"],
+        })
+
+    return app.response_class(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/resources/followup/stream", methods=["POST"])
+@login_required
+@consumes_llm_output
+def resources_followup_stream():
+    """
+    Stream a follow-up answer as chunked plain text. The browser then posts
+    the same question to /resources, which records it in the session
+    history using the answer cached here.
+    """
+    issue_text = session.get("current_issue", "")
+    followup_question = request.form.get("followup_question", "").strip()
+    if not issue_text or not followup_question:
+        return "", 204
+
+    profile_dict = get_profile_dict()
+    history = session.get("followup_history", [])
+
+    def chunks():
+        sent = False
+        for piece in stream_followup_answer(issue_text, followup_question, profile_dict, history):
+            sent = True
+            yield piece
+        if not sent:
+            yield FOLLOWUP_FALLBACK_ANSWER
+
+    return app.response_class(
+        chunks(),
+        mimetype="text/plain",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/resources-hub", methods=["GET"])
 @login_required
 def resources_hub():
@@ -1730,9 +4212,8 @@ def decision():
     if user_id:
         semantic_groups = get_recommended_groups_semantic(user_id, top_n=5)
 
-    # Fallback to keyword-based recommendations
-    ai_result = ai_suggest_resources_and_options(issue_text, profile_dict, 0)
-    keyword_groups = ai_result.get("recommended_groups", [])
+    # Fallback to keyword-based recommendations (no LLM call needed)
+    keyword_groups = ai_recommend_groups(issue_text, profile_dict)
 
     # Combine: semantic first, then keyword, deduplicated
     recommended = []
@@ -1981,24 +4462,28 @@ def group_detail(group_name):
     user_id = session.get("user_id")
     is_owner = meta.get("owner_id") == user_id
     is_member = user_id in group_members.get(group_name, set())
+    requester_ids = list(group_requests.get(group_name, set())) if is_owner else []
+    member_ids = list(group_members.get(group_name, set()))
+    profiles = load_profiles_from_db(requester_ids + member_ids)
+
     pending_requests = []
-    if is_owner:
-        for requester_id in group_requests.get(group_name, set()):
-            profile = load_profile_from_db(requester_id)
-            if profile:
-                pending_requests.append({
-                    "user_id": requester_id,
-                    "display_name": profile.get("display_name") or "Anonymous",
-                })
+    for requester_id in requester_ids:
+        profile = profiles.get(requester_id)
+        if profile:
+            pending_requests.append({
+                "user_id": requester_id,
+                "display_name": profile.get("display_name") or "Anonymous",
+            })
 
     members = []
-    for member_id in group_members.get(group_name, set()):
-        profile = load_profile_from_db(member_id)
+    for member_id in member_ids:
+        profile = profiles.get(member_id)
         if profile:
             members.append(profile.get("display_name") or "Anonymous")
 
     recent_messages = []
-    for msg in groups.get(group_name, [])[-5:]:
+    room = groups.get(group_name)
+    for msg in room.recent(5) if room is not None else []:
         recent_messages.append({
             "display_name": msg.get("display_name", "Anonymous"),
             "text": msg.get("text", ""),
@@ -2091,16 +4576,17 @@ def group_invite(group_name):
 
     # Get current user profile for matching
     current_profile = load_profile_from_db(user_id) if user_id else None
+    score_user_id = user_id
     if not current_profile:
         current_profile = {}
+        score_user_id = None
 
-    db = get_db()
-    # Exclude current user from results (same as people page)
-    all_profiles = db.execute('''
-        SELECT p.*, u.username FROM profiles p
-        JOIN users u ON p.user_id = u.id
-        WHERE p.user_id != ? AND p.display_name IS NOT NULL AND p.display_name != ''
-    ''', (user_id,)).fetchall()
+    # Exclude current user and existing members before touching the database
+    candidate_ids = find_profile_candidates(
+        search_query=search_query, search_field="invite_text", word_search=True
+    )
+    candidate_ids -= group_members.get(group_name, set())
+    all_profiles = fetch_profile_rows(sorted(candidate_ids), exclude_user_id=user_id)
 
     benefit = []
     support = []
@@ -2161,7 +4647,7 @@ def group_invite(group_name):
         support_overlap = len(set(supports + privates) & set(topics))
         
         # Calculate general match score for sorting
-        match_score = calculate_match_score(current_profile, peer_profile)
+        match_score = get_match_score(score_user_id, current_profile, row['user_id'], peer_profile, scope="invite")
         
         # Add topic match bonus to score
         topic_bonus = (benefit_overlap + support_overlap) * 10
@@ -2323,7 +4809,7 @@ def chat():
     if request.method == "POST":
         message_text = request.form.get("message_text", "").strip()
         if message_text:
-            moderation = ai_moderate_message(message_text)
+            moderation, deferred = moderate_chat_message(message_text)
 
             if not moderation["allowed"]:
                 warning = moderation["user_message"]
@@ -2337,15 +4823,21 @@ def chat():
                     "display_name": session.get("display_name", "Anonymous"),
                     "text": moderation["user_message"]
                 })
+                if deferred:
+                    schedule_message_review(current_group, msg_id, moderation["user_message"])
                 if moderation["reason"] == "severe_distress":
                     distress_banner = True
 
-    messages = groups.get(current_group, [])[-50:]
+    room = groups[current_group]
+    with room.lock:
+        messages = room.recent(50)
+        seq = room.seq
 
     return render_template(
         "chat.html",
         group_topic=current_group,
         messages=messages,
+        seq=seq,
         warning=warning,
         distress_banner=distress_banner,
         username=session.get("username"),
@@ -2354,16 +4846,124 @@ def chat():
 
 
 
+# Push channel limits: streams send a comment line every keepalive interval
+# and close after their lifetime so worker threads are recycled (EventSource
+# reconnects on its own, resuming from Last-Event-ID).
+CHAT_STREAM_KEEPALIVE = float(os.environ.get("CHAT_STREAM_KEEPALIVE", "15"))
+CHAT_STREAM_LIFETIME = float(os.environ.get("CHAT_STREAM_LIFETIME", "300"))
+CHAT_LONG_POLL_MAX = float(os.environ.get("CHAT_LONG_POLL_MAX", "25"))
+
+
 @app.route("/api/messages", methods=["GET"])
 @login_required
 def api_messages():
-    """API endpoint for polling chat messages."""
+    """
+    API endpoint for polling chat messages.
+
+    Without parameters returns the latest 50 messages. With ?after=<seq>
+    returns only messages added or edited since then plus the ids of
+    deleted ones; "reset" is set when the client is too far behind and
+    should replace its view with the returned messages. The room's seq is
+    the ETag, so an unchanged room answers If-None-Match with a 304.
+    Adding &wait=<seconds> holds the request open until something changes
+    (long-polling, capped at CHAT_LONG_POLL_MAX).
+    """
     current_group = session.get("current_group")
     if not current_group or current_group not in groups:
         return jsonify({"messages": [], "error": "No active group"})
 
-    messages = groups.get(current_group, [])[-50:]
-    return jsonify({"messages": messages})
+    room = groups[current_group]
+    after = request.args.get("after", type=int)
+    wait = min(request.args.get("wait", 0, type=float), CHAT_LONG_POLL_MAX)
+    if after is not None and wait > 0:
+        room.wait_for_change(after, wait)
+
+    room_tag = hashlib.sha1(current_group.encode("utf-8")).hexdigest()[:12]
+    with room.lock:
+        seq = room.seq
+        etag = f"{room_tag}-{seq}"
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+        if after is None:
+            payload = {"seq": seq, "messages": room.recent(50), "reset": False}
+        else:
+            payload = room_change_payload(room, after)
+
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def room_change_payload(room, after):
+    """Changes in room since seq `after`, shaped like an /api/messages response."""
+    with room.lock:
+        seq = room.seq
+        changes = room.changes_since(after)
+        if changes is None:
+            return {"seq": seq, "messages": room.recent(50), "reset": True}
+        messages, deleted = changes
+        return {"seq": seq, "messages": messages, "deleted": deleted}
+
+
+@app.route("/api/messages/stream", methods=["GET"])
+@login_required
+def api_messages_stream():
+    """
+    Server-Sent Events feed of the current room. Each event carries the
+    same payload as /api/messages?after=<seq>; the handler thread sleeps on
+    the room's condition variable until a message is added, edited or deleted.
+    """
+    current_group = session.get("current_group")
+    if not current_group or current_group not in groups:
+        # 204 tells EventSource not to reconnect
+        return "", 204
+
+    room = groups[current_group]
+    after = request.headers.get("Last-Event-ID", type=int)
+    if after is None:
+        after = request.args.get("after", type=int)
+    if after is None:
+        after = room.seq
+
+    def events(after):
+        deadline = time.monotonic() + CHAT_STREAM_LIFETIME
+        yield "retry: 2000\n\n"
+        while time.monotonic() < deadline:
+            if not room.wait_for_change(after, CHAT_STREAM_KEEPALIVE):
+                yield ": keepalive\n\n"
+                continue
+            payload = room_change_payload(room, after)
+            after = payload["seq"]
+            yield f"id: {after}\nevent: messages\ndata: {json.dumps(payload)}\n\n"
+
+    return app.response_class(
+        events(after),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/messages/earlier", methods=["GET"])
+@login_required
+def api_messages_earlier():
+    """Load older chat history before a given message (?before=<message id>)."""
+    current_group = session.get("current_group")
+    if not current_group or current_group not in groups:
+        return jsonify({"messages": [], "has_more": False, "error": "No active group"})
+
+    before = request.args.get("before", "")
+    try:
+        limit = min(max(int(request.args.get("limit", 50)), 1), 200)
+    except ValueError:
+        limit = 50
+
+    messages = groups[current_group].earlier(before, limit + 1)
+    has_more = len(messages) > limit
+    return jsonify({"messages": messages[-limit:], "has_more": has_more})
 
 
 def format_human_timestamp(timestamp_str):
@@ -2397,6 +4997,7 @@ def leave_group():
 
     if current_group and current_group in groups:
         groups[current_group].append({
+            "id": f"system_{datetime.now().strftime('%Y%m%d%H%M%S%f')}",
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "display_name": "System",
             "text": f"{display_name} has left the group.",
@@ -2424,19 +5025,21 @@ def edit_message():
     if not current_group or current_group not in groups:
         return jsonify({"success": False, "error": "No active group"})
     
-    # Find and edit the message
-    for msg in groups[current_group]:
-        if msg.get("id") == msg_id and msg.get("user_id") == user_id:
-            # Moderate the new text
-            moderation = ai_moderate_message(new_text)
-            if not moderation["allowed"]:
-                return jsonify({"success": False, "error": moderation["user_message"]})
-            
-            msg["text"] = moderation["user_message"]
-            msg["edited"] = True
-            return jsonify({"success": True, "text": msg["text"]})
-    
-    return jsonify({"success": False, "error": "Message not found or not authorized"})
+    msg = groups[current_group].get(msg_id)
+    if not msg or msg.get("user_id") != user_id:
+        return jsonify({"success": False, "error": "Message not found or not authorized"})
+
+    # Moderate the new text
+    moderation, deferred = moderate_chat_message(new_text)
+    if not moderation["allowed"]:
+        return jsonify({"success": False, "error": moderation["user_message"]})
+
+    msg = groups[current_group].edit(msg_id, moderation["user_message"])
+    if not msg:
+        return jsonify({"success": False, "error": "Message not found or not authorized"})
+    if deferred:
+        schedule_message_review(current_group, msg_id, msg["text"])
+    return jsonify({"success": True, "text": msg["text"]})
 
 
 @app.route("/api/message/delete", methods=["POST"])
@@ -2455,13 +5058,29 @@ def delete_message():
     if not current_group or current_group not in groups:
         return jsonify({"success": False, "error": "No active group"})
     
-    # Find and delete the message
-    for i, msg in enumerate(groups[current_group]):
-        if msg.get("id") == msg_id and msg.get("user_id") == user_id:
-            groups[current_group].pop(i)
-            return jsonify({"success": True})
-    
-    return jsonify({"success": False, "error": "Message not found or not authorized"})
+    room = groups[current_group]
+    msg = room.get(msg_id)
+    if not msg or msg.get("user_id") != user_id:
+        return jsonify({"success": False, "error": "Message not found or not authorized"})
+
+    room.delete(msg_id)
+    return jsonify({"success": True})
+
+
+@app.route("/api/moderate/batch", methods=["POST"])
+@login_required
+def moderate_batch():
+    """Moderate a list of texts in one request: {"texts": [...]} -> {"results": [...]}."""
+    data = request.get_json(silent=True) or {}
+    texts = data.get("texts")
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        return jsonify({"success": False, "error": "Expected a list of texts"})
+    if len(texts) > MODERATION_BATCH_LIMIT:
+        return jsonify({"success": False, "error": f"At most {MODERATION_BATCH_LIMIT} texts per request"})
+    if not take_moderation_quota(session["user_id"], len(texts)):
+        return jsonify({"success": False, "error": "Too many moderation requests; try again in a minute"}), 429
+
+    return jsonify({"success": True, "results": ai_moderate_messages(texts)})
 
 
 # -----------------------------------------------------------------------------
@@ -2490,90 +5109,364 @@ def get_profile_summary(profile_dict):
     return " | ".join(parts) if parts else "ASU Student"
 
 
-def cache_user_profile(user_id, display_name, profile_dict):
-    """Cache user profile for peer display."""
-    user_profiles[user_id] = {
-        "display_name": display_name,
-        "profile_summary": get_profile_summary(profile_dict),
-        "gender": profile_dict.get("gender", ""),
-        "preferred_language": profile_dict.get("preferred_language", ""),
-        "support_topics": profile_dict.get("support_topics", []),
-        "private_topics": profile_dict.get("private_topics", []),
-        "languages": profile_dict.get("languages", []),
-        "cultural_background": profile_dict.get("cultural_background", []),
-        "support_style": profile_dict.get("support_style", "mixed"),
-    }
-
-
 def get_pending_requests_for_user(user_id):
     """Get all pending connection requests for a user."""
     return pending_requests.get(user_id, [])
 
 
-def calculate_match_score(current_profile, peer_profile):
-    """Calculate a simple match score between two profiles."""
-    current_topics = normalize_topic_ids(
-        (current_profile.get("primary_challenge", []) or [])
-        + (current_profile.get("support_topics", []) or [])
-        + (current_profile.get("private_topics", []) or [])
-    )
-    peer_topics = normalize_topic_ids(
-        (peer_profile.get("support_topics", []) or [])
-        + (peer_profile.get("primary_challenge", []) or [])
-        + (peer_profile.get("private_topics", []) or [])
+# Bitset profile encoding: topics map to fixed bits from SUPPORT_TOPIC_INDEX,
+# languages and cultures to bits assigned on first sight. Overlap and Jaccard
+# become AND/OR plus popcount instead of per-call set construction.
+# Language and culture masks are PROFILE_VALUE_BITS wide: the first values
+# seen get their own bit, and once those run out further values are hashed
+# onto the last PROFILE_VALUE_HASH_BITS bits (rare values may then collide).
+TOPIC_BITS = {topic_id: 1 << i for i, topic_id in enumerate(SUPPORT_TOPIC_INDEX)}
+PROFILE_VALUE_BITS = int(os.environ.get("PROFILE_VALUE_BITS", "128"))
+PROFILE_VALUE_HASH_BITS = max(1, PROFILE_VALUE_BITS // 4)
+profile_value_bits = {"language": {}, "culture": {}}
+profile_value_bits_lock = threading.Lock()
+
+ProfileBits = namedtuple(
+    "ProfileBits",
+    ["topics", "topic_count", "languages", "cultures", "gender", "grad_year", "degree"],
+)
+
+
+def popcount(mask):
+    """Number of set bits in an integer mask."""
+    return mask.bit_count()
+
+
+def value_bit(kind, value):
+    """Bit for a free-form value: its own while any are left, else a hashed one."""
+    bits = profile_value_bits[kind]
+    bit = bits.get(value)
+    if bit is None:
+        dedicated = PROFILE_VALUE_BITS - PROFILE_VALUE_HASH_BITS
+        with profile_value_bits_lock:
+            bit = bits.get(value)
+            if bit is None and len(bits) < dedicated:
+                bit = bits[value] = 1 << len(bits)
+        if bit is None:
+            digest = hashlib.blake2b(str(value).encode("utf-8"), digest_size=4).digest()
+            bit = 1 << (dedicated + int.from_bytes(digest, "big") % PROFILE_VALUE_HASH_BITS)
+    return bit
+
+
+def value_mask(kind, values):
+    """OR together the bits for free-form values, assigning new bits as needed."""
+    mask = 0
+    for value in values:
+        mask |= value_bit(kind, value)
+    return mask
+
+
+def topic_mask(topic_ids):
+    """OR together the bits for already-normalized topic ids."""
+    mask = 0
+    for topic_id in topic_ids:
+        mask |= TOPIC_BITS[topic_id]
+    return mask
+
+
+def encode_profile_bits(profile_dict):
+    """Pack the fields used by the match scores into a ProfileBits tuple."""
+    topics = normalize_topic_ids(
+        list(profile_dict.get("primary_challenge", []) or [])
+        + list(profile_dict.get("support_topics", []) or [])
+        + list(profile_dict.get("private_topics", []) or [])
     )
 
-    topic_overlap = len(set(current_topics) & set(peer_topics))
-    topic_union = len(set(current_topics) | set(peer_topics))
-    topic_score = (topic_overlap / topic_union) if topic_union else 0.0
-
-    lang_score = 0.0
-    current_langs = set(current_profile.get("languages", []) or [])
-    peer_langs = set(peer_profile.get("languages", []) or [])
-    if current_profile.get("preferred_language"):
-        current_langs.add(current_profile.get("preferred_language"))
-    if peer_profile.get("preferred_language"):
-        peer_langs.add(peer_profile.get("preferred_language"))
-    if current_langs & peer_langs:
-        lang_score = 1.0
-
-    culture_score = 0.0
-    current_cultures = set(current_profile.get("cultural_background", []) or [])
-    peer_cultures = set(peer_profile.get("cultural_background", []) or [])
-    if current_cultures & peer_cultures:
-        culture_score = 1.0
-
-    # Gender matching (optional - only if both specify)
-    gender_score = 0.0
-    current_gender = current_profile.get("gender", "")
-    peer_gender = peer_profile.get("gender", "")
-    if current_gender and peer_gender and current_gender == peer_gender and current_gender != "prefer-not-to-say":
-        gender_score = 1.0
-    
-    # Graduation year matching (within 1 year counts as match)
-    grad_year_score = 0.0
-    current_grad = current_profile.get("graduation_year", "")
-    peer_grad = peer_profile.get("graduation_year", "")
-    if current_grad and peer_grad:
+    languages = set(profile_dict.get("languages", []) or [])
+    if profile_dict.get("preferred_language"):
+        languages.add(profile_dict.get("preferred_language"))
+
+    gender = profile_dict.get("gender", "") or ""
+    if gender == "prefer-not-to-say":
+        gender = ""
+
+    grad_year = None
+    graduation = profile_dict.get("graduation_year", "")
+    if graduation:
         try:
-            current_year = int(current_grad.replace("+", "")[:4])  # Handle "2030+"
-            peer_year = int(peer_grad.replace("+", "")[:4])
-            if abs(current_year - peer_year) <= 1:
-                grad_year_score = 1.0
+            grad_year = int(graduation.replace("+", "")[:4])  # Handle "2030+"
         except:
             pass
-    
-    # Degree program matching
-    degree_score = 0.0
-    current_degree = current_profile.get("degree_program", "")
-    peer_degree = peer_profile.get("degree_program", "")
-    if current_degree and peer_degree and current_degree == peer_degree:
-        degree_score = 1.0
+
+    return ProfileBits(
+        topics=topic_mask(topics),
+        topic_count=len(topics),
+        languages=value_mask("language", languages),
+        cultures=value_mask("culture", profile_dict.get("cultural_background", []) or []),
+        gender=gender,
+        grad_year=grad_year,
+        degree=profile_dict.get("degree_program", "") or "",
+    )
+
+
+def match_score_from_bits(current, peer):
+    """calculate_match_score over two ProfileBits."""
+    topic_union = popcount(current.topics | peer.topics)
+    topic_score = (popcount(current.topics & peer.topics) / topic_union) if topic_union else 0.0
+    lang_score = 1.0 if current.languages & peer.languages else 0.0
+    culture_score = 1.0 if current.cultures & peer.cultures else 0.0
+    gender_score = 1.0 if current.gender and current.gender == peer.gender else 0.0
+    grad_year_score = 0.0
+    if current.grad_year is not None and peer.grad_year is not None:
+        if abs(current.grad_year - peer.grad_year) <= 1:
+            grad_year_score = 1.0
+    degree_score = 1.0 if current.degree and current.degree == peer.degree else 0.0
 
     score = (topic_score * 60) + (lang_score * 10) + (culture_score * 10) + (gender_score * 10) + (grad_year_score * 5) + (degree_score * 5)
     return int(round(score))
 
 
+def calculate_match_score(current_profile, peer_profile):
+    """Calculate a simple match score between two profiles."""
+    return match_score_from_bits(encode_profile_bits(current_profile), encode_profile_bits(peer_profile))
+
+
+# -----------------------------------------------------------------------------
+# Bulk Scoring (NumPy)
+# Columnar ProfileBits for a whole candidate population, scored in one pass.
+# -----------------------------------------------------------------------------
+
+ProfileColumns = namedtuple(
+    "ProfileColumns",
+    ["topics", "topic_count", "languages", "cultures", "gender", "grad_year", "grad_valid", "degree"],
+)
+
+
+def _bitwise_count(array):
+    """Per-element popcount of a uint64 array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(array).astype(np.int64)
+    as_bytes = array.reshape(-1, 1).view(np.uint8)
+    return np.unpackbits(as_bytes, axis=1).sum(axis=1).reshape(array.shape).astype(np.int64)
+
+
+def _mask_words(masks, words):
+    """Split arbitrary-width int masks into an (n, words) uint64 array."""
+    out = np.zeros((len(masks), words), dtype=np.uint64)
+    for i, mask in enumerate(masks):
+        w = 0
+        while mask:
+            out[i, w] = mask & 0xFFFFFFFFFFFFFFFF
+            mask >>= 64
+            w += 1
+    return out
+
+
+def build_profile_columns(bits_list):
+    """
+    Pack a list of ProfileBits into columnar arrays for bulk_match_scores.
+    Returns (columns, codes) where codes maps gender/degree strings to ids.
+    """
+    words = max(1, (PROFILE_VALUE_BITS + 63) // 64)
+    codes = {"": 0}
+    gender = [codes.setdefault(b.gender, len(codes)) for b in bits_list]
+    degree = [codes.setdefault(b.degree, len(codes)) for b in bits_list]
+    return ProfileColumns(
+        topics=np.fromiter((b.topics for b in bits_list), dtype=np.uint64, count=len(bits_list)),
+        topic_count=np.fromiter((b.topic_count for b in bits_list), dtype=np.int64, count=len(bits_list)),
+        languages=_mask_words([b.languages for b in bits_list], words),
+        cultures=_mask_words([b.cultures for b in bits_list], words),
+        gender=np.array(gender, dtype=np.int64),
+        grad_year=np.array([b.grad_year or 0 for b in bits_list], dtype=np.int64),
+        grad_valid=np.array([b.grad_year is not None for b in bits_list], dtype=bool),
+        degree=np.array(degree, dtype=np.int64),
+    ), codes
+
+
+def bulk_match_scores(current_bits, bits_list):
+    """
+    calculate_match_score for one profile against many, as one vectorized pass.
+    Returns an int64 array aligned with bits_list with identical integer results.
+    """
+    if not bits_list:
+        return np.zeros(0, dtype=np.int64)
+    columns, codes = build_profile_columns(bits_list)
+    words = columns.languages.shape[1]
+
+    current_topics = np.uint64(current_bits.topics)
+    union = _bitwise_count(columns.topics | current_topics)
+    overlap = _bitwise_count(columns.topics & current_topics)
+    topic_score = np.divide(overlap, union, out=np.zeros(len(bits_list)), where=union > 0)
+
+    current_langs = _mask_words([current_bits.languages], words)[0]
+    current_cultures = _mask_words([current_bits.cultures], words)[0]
+    lang_score = np.any(columns.languages & current_langs, axis=1).astype(np.float64)
+    culture_score = np.any(columns.cultures & current_cultures, axis=1).astype(np.float64)
+
+    gender_code = codes.get(current_bits.gender, -1) if current_bits.gender else -1
+    gender_score = (columns.gender == gender_code).astype(np.float64)
+    if current_bits.grad_year is not None:
+        grad_year_score = (columns.grad_valid & (np.abs(columns.grad_year - current_bits.grad_year) <= 1)).astype(np.float64)
+    else:
+        grad_year_score = np.zeros(len(bits_list))
+    degree_code = codes.get(current_bits.degree, -1) if current_bits.degree else -1
+    degree_score = (columns.degree == degree_code).astype(np.float64)
+
+    score = (topic_score * 60) + (lang_score * 10) + (culture_score * 10) + (gender_score * 10) + (grad_year_score * 5) + (degree_score * 5)
+    return np.rint(score).astype(np.int64)
+
+
+def score_peer_profiles(user_id, current_profile, peer_profiles, scope="people"):
+    """
+    Match scores for [(peer_id, peer_profile), ...] against current_profile.
+    Pairs already in the per-pair cache are read from it; the rest are
+    scored in one bulk_match_scores pass (when numpy is available) and
+    written back. user_id=None means current_profile is not the stored
+    one, so nothing is cached.
+    """
+    if np is None:
+        return [get_match_score(user_id, current_profile, peer_id, peer_profile, scope)
+                for peer_id, peer_profile in peer_profiles]
+    if user_id is None:
+        current_bits = encode_profile_bits(current_profile)
+        bits_list = [get_profile_bits(peer_id, peer_profile, scope) for peer_id, peer_profile in peer_profiles]
+        return bulk_match_scores(current_bits, bits_list).tolist()
+
+    user_version = get_profile_version(user_id)
+    keys = [(user_id, peer_id, user_version, get_profile_version(peer_id), scope)
+            for peer_id, _ in peer_profiles]
+    scores = [None] * len(keys)
+    with match_score_lock:
+        for i, key in enumerate(keys):
+            score = match_score_cache.get(key)
+            if score is not None:
+                match_score_cache.move_to_end(key)
+                scores[i] = score
+
+    misses = [i for i, score in enumerate(scores) if score is None]
+    if misses:
+        current_bits = get_profile_bits(user_id, current_profile, scope, "viewer")
+        bits_list = [get_profile_bits(*peer_profiles[i], scope) for i in misses]
+        for i, score in zip(misses, bulk_match_scores(current_bits, bits_list).tolist()):
+            scores[i] = score
+            store_match_score(keys[i], score)
+    return scores
+
+
+def rank_indices(keys, k=None, descending=True):
+    """
+    Stable ordering of indices by integer keys; with k, only the first k via
+    argpartition. Ties keep their original order, matching list.sort(reverse=...).
+    """
+    if np is None:
+        order = sorted(range(len(keys)), key=lambda i: keys[i], reverse=descending)
+        return order if k is None else order[:max(k, 0)]
+    keys = np.asarray(keys, dtype=np.int64)
+    n = len(keys)
+    # Fold the original position into the key so partial sorts stay stable
+    composite = (-keys if descending else keys) * n + np.arange(n, dtype=np.int64) if n else keys
+    if k is None or k >= n:
+        return np.argsort(composite, kind="stable")
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(composite, k - 1)[:k]
+    return top[np.argsort(composite[top], kind="stable")]
+
+
+# Match score cache: { (user_a, user_b, version_a, version_b, scope): score }, LRU-evicted.
+# Versions are bumped by save_profile_to_db, so stale pairs are never read back.
+MATCH_SCORE_CACHE_SIZE = int(os.environ.get("MATCH_SCORE_CACHE_SIZE", "100000"))
+match_score_cache = OrderedDict()
+match_score_keys = {}  # { user_id: set(cache keys involving that user) }
+profile_versions = {}  # { user_id: int }
+match_score_lock = threading.Lock()
+
+# Encoded profiles: { (user_id, scope, role): (version, ProfileBits) }, LRU-evicted.
+# role separates a viewer's own (full) profile from the trimmed peer rows the
+# same scope builds for them, so a score never depends on which was cached first.
+PROFILE_BITS_CACHE_SIZE = int(os.environ.get("PROFILE_BITS_CACHE_SIZE", "20000"))
+profile_bits_cache = OrderedDict()
+profile_bits_lock = threading.Lock()
+
+
+def get_profile_version(user_id):
+    """Return the current profile version for a user."""
+    return profile_versions.get(user_id, 0)
+
+
+def _drop_match_score(key):
+    match_score_cache.pop(key, None)
+    for uid in key[:2]:
+        keys = match_score_keys.get(uid)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del match_score_keys[uid]
+
+
+def bump_profile_version(user_id):
+    """Mark a user's profile as changed and drop cached scores that involve it."""
+    with match_score_lock:
+        profile_versions[user_id] = profile_versions.get(user_id, 0) + 1
+        for key in list(match_score_keys.get(user_id, ())):
+            _drop_match_score(key)
+
+
+def get_profile_bits(user_id, profile_dict, scope="people", role="peer"):
+    """
+    Return ProfileBits for a stored profile, re-encoding only after its
+    version changes. role is "viewer" for the scoring user's own profile.
+    """
+    version = get_profile_version(user_id)
+    key = (user_id, scope, role)
+    with profile_bits_lock:
+        cached = profile_bits_cache.get(key)
+        if cached is not None and cached[0] == version:
+            profile_bits_cache.move_to_end(key)
+            return cached[1]
+    bits = encode_profile_bits(profile_dict)
+    with profile_bits_lock:
+        profile_bits_cache[key] = (version, bits)
+        profile_bits_cache.move_to_end(key)
+        while len(profile_bits_cache) > PROFILE_BITS_CACHE_SIZE:
+            profile_bits_cache.popitem(last=False)
+    return bits
+
+
+def get_match_score(user_id, current_profile, peer_id, peer_profile, scope="people"):
+    """
+    calculate_match_score with caching by (user, peer, profile versions).
+    scope separates callers that build peer profiles from different fields.
+    Pass user_id=None when current_profile is not the stored profile
+    (e.g. a session fallback) to bypass the cache.
+    """
+    if user_id is None or peer_id is None:
+        return calculate_match_score(current_profile, peer_profile)
+
+    key = (user_id, peer_id, get_profile_version(user_id), get_profile_version(peer_id), scope)
+    with match_score_lock:
+        score = match_score_cache.get(key)
+        if score is not None:
+            match_score_cache.move_to_end(key)
+            return score
+
+    score = match_score_from_bits(
+        get_profile_bits(user_id, current_profile, scope, "viewer"),
+        get_profile_bits(peer_id, peer_profile, scope),
+    )
+    store_match_score(key, score)
+    return score
+
+
+def store_match_score(key, score):
+    """Cache a score under its (user, peer, versions, scope) key, LRU-evicting."""
+    user_id, peer_id = key[:2]
+    with match_score_lock:
+        # Skip the write if either profile changed while scoring
+        if key[2:4] != (get_profile_version(user_id), get_profile_version(peer_id)):
+            return
+        match_score_cache[key] = score
+        match_score_keys.setdefault(user_id, set()).add(key)
+        match_score_keys.setdefault(peer_id, set()).add(key)
+        while len(match_score_cache) > MATCH_SCORE_CACHE_SIZE:
+            _drop_match_score(next(iter(match_score_cache)))
+
+
 def calculate_group_match_score(user_profile, group_meta_dict, last_issue_text=None):
     """
     Calculate how well a group matches a user's profile.
@@ -2583,9 +5476,9 @@ def calculate_group_match_score(user_profile, group_meta_dict, last_issue_text=N
     
     # Get user's topics (all types combined)
     user_topics = normalize_topic_ids(
-        (user_profile.get("primary_challenge", []) or [])
-        + (user_profile.get("support_topics", []) or [])
-        + (user_profile.get("private_topics", []) or [])
+        list(user_profile.get("primary_challenge", []) or [])
+        + list(user_profile.get("support_topics", []) or [])
+        + list(user_profile.get("private_topics", []) or [])
     )
     
     # Get group's topics
@@ -2593,7 +5486,7 @@ def calculate_group_match_score(user_profile, group_meta_dict, last_issue_text=N
     
     # Topic overlap score (up to 50 points)
     if user_topics and group_topics:
-        overlap = len(set(user_topics) & set(group_topics))
+        overlap = popcount(topic_mask(user_topics) & topic_mask(group_topics))
         max_possible = min(len(user_topics), len(group_topics))
         if max_possible > 0:
             score += (overlap / max_possible) * 50
@@ -2641,13 +5534,9 @@ def add_connection_request(sender_id, sender_display_name, recipient_id, message
     
     # Get recipient display name for outgoing tracking
     recipient_display_name = "User"
-    if recipient_id in user_profiles:
-        recipient_display_name = user_profiles[recipient_id].get("display_name", "User")
-    else:
-        db = get_db()
-        row = db.execute('SELECT display_name FROM profiles WHERE user_id = ?', (recipient_id,)).fetchone()
-        if row and row['display_name']:
-            recipient_display_name = row['display_name']
+    recipient_profile = load_profile_from_db(recipient_id)
+    if recipient_profile and recipient_profile.get("display_name"):
+        recipient_display_name = recipient_profile["display_name"]
     
     pending_requests[recipient_id].append({
         "sender_id": sender_id,
@@ -2677,33 +5566,39 @@ def remove_connection_request(recipient_id, sender_id):
         ]
 
 
-@app.route("/people", methods=["GET"])
-@login_required
-def people():
-    """Show recommended peers based on semantic matching."""
-    if not session.get("display_name"):
-        return redirect(url_for("onboarding"))
-    
-    user_id = session.get("user_id")
-    search_query = request.args.get("q", "").strip().lower()
-    selected_topics = request.args.getlist("topics")
-    sort_by = request.args.get("sort", "best")
-    filter_challenge = request.args.get("filter", "")
-    selected_topics = normalize_topic_ids(selected_topics)
-    
-    current_profile = load_profile_from_db(user_id) if user_id else None
-    if not current_profile:
-        current_profile = get_profile_dict()
-    
-    # Get all profiles from database
-    db = get_db()
-    all_profiles = db.execute('''
-        SELECT p.*, u.username FROM profiles p 
-        JOIN users u ON p.user_id = u.id 
-        WHERE p.user_id != ? AND p.display_name IS NOT NULL AND p.display_name != ''
-    ''', (user_id,)).fetchall()
+PEOPLE_PAGE_SIZE = 24
+
+
+def get_peer_match_label(match_score):
+    """Label shown next to a peer's match score."""
+    if match_score >= 80:
+        return "Best Fit"
+    elif match_score >= 60:
+        return "Good Fit"
+    return "New Peer"
+
+
+def collect_people_candidates(user_id, search_query, selected_topics, filter_challenge):
+    """
+    Build the filtered /people candidate list in user_id order.
+    Database peers are returned unscored (match_score None) together with
+    their parsed profiles, so callers can score only what they display.
+    """
+    # Narrow candidates with the inverted index, then fetch only those rows
+    if selected_topics or search_query:
+        candidate_ids = find_profile_candidates({"topic": selected_topics}, search_query)
+        all_profiles = fetch_profile_rows(sorted(candidate_ids), exclude_user_id=user_id)
+    else:
+        db = get_db()
+        all_profiles = db.execute('''
+            SELECT p.*, u.username FROM profiles p 
+            JOIN users u ON p.user_id = u.id 
+            WHERE p.user_id != ? AND p.display_name IS NOT NULL AND p.display_name != ''
+            ORDER BY p.user_id
+        ''', (user_id,)).fetchall()
     
     peers = []
+    peer_profiles = {}
     for row in all_profiles:
         challenges = normalize_topic_ids((row['primary_challenge'] or '').split(','))
         support_topics = normalize_topic_ids((row['support_topics'] or '').split(','))
@@ -2754,14 +5649,6 @@ def people():
             if search_query not in searchable:
                 continue
 
-        match_score = calculate_match_score(current_profile, peer_profile)
-        if match_score >= 80:
-            match_label = "Best Fit"
-        elif match_score >= 60:
-            match_label = "Good Fit"
-        else:
-            match_label = "New Peer"
-
         peers.append({
             "user_id": row['user_id'],
             "display_name": row['display_name'] or 'Anonymous',
@@ -2771,23 +5658,20 @@ def people():
             "public_topics": public_topics,
             "support_style": row['support_style'] or 'mixed',
             "languages": peer_profile.get("languages", []),
-            "match_score": match_score,
-            "match_label": match_label
+            "match_score": None,
+            "match_label": "",
         })
-    
+        peer_profiles[row['user_id']] = peer_profile
+
     # Also add from in-memory cache for real-time peers
     if user_id:
         similar = get_similar_users(user_id, top_n=10, threshold=0.2)
+        seen_ids = {p['user_id'] for p in peers}
         for peer_id, score in similar:
             peer_profile = user_profiles.get(peer_id)
-            if peer_profile and not any(p['user_id'] == peer_id for p in peers):
+            if peer_profile and peer_id not in seen_ids:
+                seen_ids.add(peer_id)
                 match_score = int(round(score * 100))
-                if match_score >= 80:
-                    match_label = "Best Fit"
-                elif match_score >= 60:
-                    match_label = "Good Fit"
-                else:
-                    match_label = "New Peer"
                 peers.append({
                     "user_id": peer_id,
                     "display_name": peer_profile.get("display_name", "Anonymous"),
@@ -2798,36 +5682,170 @@ def people():
                     "support_style": peer_profile.get("support_style", "mixed"),
                     "languages": peer_profile.get("languages", []),
                     "match_score": match_score,
-                    "match_label": match_label
+                    "match_label": get_peer_match_label(match_score)
                 })
+
+    return peers, peer_profiles
+
+
+def score_people(peers, peer_profiles, score_user_id, current_profile):
+    """Fill in match scores for peers that do not have one yet, in one pass."""
+    pending = [p for p in peers if p["match_score"] is None]
+    if not pending:
+        return
+    scores = score_peer_profiles(
+        score_user_id, current_profile,
+        [(p["user_id"], peer_profiles[p["user_id"]]) for p in pending],
+    )
+    for peer, match_score in zip(pending, scores):
+        peer["match_score"] = match_score
+        peer["match_label"] = get_peer_match_label(match_score)
+
+
+def people_sort_key(peer, sort_by):
+    """Total order used for /people pages; user_id breaks ties."""
+    if sort_by == "alpha":
+        return (peer["display_name"], peer["user_id"])
+    if sort_by == "recent":
+        return (-peer["user_id"],)
+    return (-peer["match_score"], peer["user_id"])
+
+
+def people_rank_key(peer, sort_by):
+    """
+    Integer form of people_sort_key for the numeric orders: ranking these
+    keys descending gives the same order (user ids fit in 32 bits).
+    """
+    if sort_by == "recent":
+        return peer["user_id"]
+    return peer["match_score"] * 2 ** 32 - peer["user_id"]
+
+
+def encode_people_cursor(sort_by, key):
+    """Opaque keyset cursor: the sort key of the last peer on a page."""
+    payload = json.dumps({"sort": sort_by, "key": list(key)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_people_cursor(cursor, sort_by):
+    """Return the sort key stored in cursor, or None if missing or invalid."""
+    if not cursor:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if payload.get("sort") != sort_by:
+            return None
+        return tuple(payload["key"])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None
+
+
+def paginate_people(peers, peer_profiles, sort_by, cursor, limit, score_user_id, current_profile):
+    """
+    Select one page of peers after cursor: a partial rank_indices pass for
+    the numeric orders (best, recent), a bounded heap for alphabetical.
+    Only the best-match order needs every score up front; alphabetical and
+    recent pages score just the peers they return.
+    Returns (page, next_cursor).
+    """
+    if sort_by not in ("alpha", "recent"):
+        score_people(peers, peer_profiles, score_user_id, current_profile)
+
+    after = decode_people_cursor(cursor, sort_by)
+    candidates = peers
+    if after is not None:
+        try:
+            candidates = [p for p in peers if people_sort_key(p, sort_by) > after]
+        except TypeError:
+            candidates = peers
+    if np is not None and sort_by != "alpha":
+        keys = [people_rank_key(p, sort_by) for p in candidates]
+        page = [candidates[i] for i in rank_indices(keys, k=limit + 1)]
+    else:
+        page = heapq.nsmallest(limit + 1, candidates, key=lambda p: people_sort_key(p, sort_by))
+
+    has_more = len(page) > limit
+    page = page[:limit]
+    score_people(page, peer_profiles, score_user_id, current_profile)
+    next_cursor = encode_people_cursor(sort_by, people_sort_key(page[-1], sort_by)) if has_more else None
+    return page, next_cursor
+
+
+def get_people_page():
+    """Parse /people query args and return (page, next_cursor, params) for the current user."""
+    user_id = session.get("user_id")
+    search_query = request.args.get("q", "").strip().lower()
+    selected_topics = normalize_topic_ids(request.args.getlist("topics"))
+    sort_by = request.args.get("sort", "best")
+    filter_challenge = request.args.get("filter", "")
+    cursor = request.args.get("cursor", "")
+    try:
+        limit = max(1, min(int(request.args.get("limit", PEOPLE_PAGE_SIZE)), 100))
+    except ValueError:
+        limit = PEOPLE_PAGE_SIZE
+
+    current_profile = load_profile_from_db(user_id) if user_id else None
+    score_user_id = user_id
+    if not current_profile:
+        current_profile = get_profile_dict()
+        score_user_id = None
+
+    peers, peer_profiles = collect_people_candidates(user_id, search_query, selected_topics, filter_challenge)
+    page, next_cursor = paginate_people(
+        peers, peer_profiles, sort_by, cursor, limit, score_user_id, current_profile
+    )
+    params = {
+        "search_query": search_query,
+        "selected_topics": selected_topics,
+        "sort_by": sort_by,
+        "filter": filter_challenge,
+        "cursor": cursor,
+    }
+    return page, next_cursor, params
+
+
+@app.route("/people", methods=["GET"])
+@login_required
+def people():
+    """Show recommended peers based on semantic matching."""
+    if not session.get("display_name"):
+        return redirect(url_for("onboarding"))
+    
+    user_id = session.get("user_id")
+    peers, next_cursor, params = get_people_page()
     
     # Get pending requests for current user
     incoming_requests = get_pending_requests_for_user(user_id)
-    
-    if sort_by == "alpha":
-        peers.sort(key=lambda p: p.get("display_name", ""))
-    elif sort_by == "recent":
-        peers.sort(key=lambda p: p.get("user_id", 0), reverse=True)
-    else:
-        peers.sort(key=lambda p: p.get("match_score", 0), reverse=True)
 
-    recommended_peers = peers[:3]
+    recommended_peers = peers[:3] if not params["cursor"] else []
 
     return render_template(
         "people.html",
         peers=peers,
         recommended_peers=recommended_peers,
-        filter=filter_challenge,
+        next_cursor=next_cursor,
+        filter=params["filter"],
         incoming_requests=incoming_requests,
         username=session.get("username"),
         support_topic_categories=SUPPORT_TOPIC_CATEGORIES,
         support_topic_index=SUPPORT_TOPIC_INDEX,
-        selected_topics=selected_topics,
-        search_query=search_query,
-        sort_by=sort_by
+        selected_topics=params["selected_topics"],
+        search_query=params["search_query"],
+        sort_by=params["sort_by"]
     )
 
 
+@app.route("/api/people", methods=["GET"])
+@login_required
+def api_people():
+    """JSON page of /people results with a keyset cursor for the next page."""
+    if not session.get("display_name"):
+        return jsonify({"peers": [], "next_cursor": None, "error": "Profile required"}), 400
+
+    peers, next_cursor, _ = get_people_page()
+    return jsonify({"peers": peers, "next_cursor": next_cursor})
+
+
 @app.route("/connect", methods=["POST"])
 @login_required
 def connect():
@@ -2945,26 +5963,17 @@ def connect_ignore():
 
 def get_connected_peers(user_id):
     """Get list of connected peers for a user."""
-    connected_ids = peer_connections.get(user_id, set())
+    connected_ids = list(peer_connections.get(user_id, set()))
+    peer_profiles = load_profiles_from_db(connected_ids)
     peers = []
     for peer_id in connected_ids:
-        peer_profile = user_profiles.get(peer_id)
+        peer_profile = peer_profiles.get(peer_id)
         if peer_profile:
             peers.append({
                 "user_id": peer_id,
-                "display_name": peer_profile.get("display_name", "Anonymous"),
-                "match_reason": peer_profile.get("profile_summary", "")
+                "display_name": peer_profile.get("display_name") or "Anonymous",
+                "match_reason": get_profile_summary(peer_profile)
             })
-        else:
-            # Try to load from DB
-            db = get_db()
-            row = db.execute('SELECT display_name FROM profiles WHERE user_id = ?', (peer_id,)).fetchone()
-            if row:
-                peers.append({
-                    "user_id": peer_id,
-                    "display_name": row['display_name'] or "Anonymous",
-                    "match_reason": ""
-                })
     return peers
 
 def get_outgoing_requests(user_id):
@@ -3012,6 +6021,8 @@ def peers_page():
     if user_id:
         similar = get_similar_users(user_id, top_n=6, threshold=0.3)
         connected_ids = peer_connections.get(user_id, set())
+        profiles = load_profiles_from_db([user_id] + [peer_id for peer_id, _ in similar])
+        current_profile = profiles.get(user_id)
         for peer_id, score in similar:
             # Skip already connected peers
             if peer_id in connected_ids:
@@ -3024,9 +6035,8 @@ def peers_page():
             if has_outgoing:
                 continue
             
-            peer_profile = user_profiles.get(peer_id)
+            peer_profile = profiles.get(peer_id)
             if peer_profile:
-                current_profile = load_profile_from_db(user_id)
                 common_topics = []
                 if current_profile and peer_profile:
                     my_topics = set(normalize_topic_ids(current_profile.get("support_topics", [])))
@@ -3189,17 +6199,22 @@ def my_groups_page():
     
     # Get group join requests (for groups you own)
     group_join_requests = []
-    for group_name, requesters in group_requests.items():
-        group_info = group_meta.get(group_name, {})
-        if group_info.get("owner_id") == user_id:
-            for requester_id in requesters:
-                requester_profile = load_profile_from_db(requester_id)
-                if requester_profile:
-                    group_join_requests.append({
-                        "user_id": requester_id,
-                        "group_name": group_name,
-                        "display_name": requester_profile.get("display_name", "Anonymous")
-                    })
+    owned_requests = [
+        (group_name, list(requesters)) for group_name, requesters in group_requests.items()
+        if group_meta.get(group_name, {}).get("owner_id") == user_id
+    ]
+    requester_profiles = load_profiles_from_db(
+        [requester_id for _, requesters in owned_requests for requester_id in requesters]
+    )
+    for group_name, requesters in owned_requests:
+        for requester_id in requesters:
+            requester_profile = requester_profiles.get(requester_id)
+            if requester_profile:
+                group_join_requests.append({
+                    "user_id": requester_id,
+                    "group_name": group_name,
+                    "display_name": requester_profile.get("display_name", "Anonymous")
+                })
     
     # Get pending group invitations
     pending_invitations = []
@@ -3302,6 +6317,18 @@ def decline_group_invitation():
 
 
 
+# -----------------------------------------------------------------------------
+# Application Startup
+# Runs on import, so WSGI servers (which never execute the __main__ block)
+# also restore saved vectors instead of re-embedding every profile.
+# -----------------------------------------------------------------------------
+
+load_embeddings()
+embedding_refresh_queue.replay()
+if MODERATION_RESCAN_ON_START:
+    threading.Thread(target=rescan_all_rooms, name="moderation-rescan", daemon=True).start()
+
+
 # -----------------------------------------------------------------------------
 # Run Application
 # -----------------------------------------------------------------------------
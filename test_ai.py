@@ -0,0 +1,262 @@
+"""Test the LLM client and the AI-backed helpers using the stub backend."""
+import os
+import sys
+import tempfile
+import time
+sys.path.insert(0, ".")
+
+import app
+from app import (
+    StubLLMClient,
+    SupportResponseParser,
+    stream_support_response,
+    stream_followup_answer,
+    close_llm_client,
+    get_llm_client,
+    generate_support_response,
+    generate_followup_answer,
+)
+
+
+def use_stub_backend():
+    """Switch to the stub backend; returns a function that restores the previous setup."""
+    saved = os.environ.get("LIVE_AI"), app.LLM_BACKEND
+    os.environ["LIVE_AI"] = "1"
+    close_llm_client()
+    app.LLM_BACKEND = "stub"
+    app.support_response_cache.clear()
+
+    def restore():
+        close_llm_client()
+        os.environ["LIVE_AI"], app.LLM_BACKEND = saved
+
+    return restore
+
+
+def test_llm_client():
+    print("Testing shared LLM client...")
+    print("=" * 50)
+
+    restore = use_stub_backend()
+    try:
+        client = get_llm_client()
+        assert isinstance(client, StubLLMClient)
+        assert get_llm_client() is client
+
+        result = generate_support_response("I miss my family and feel lonely", {"display_name": "Sam"})
+        print(f"Support response: {result}")
+        assert result["message"]
+        assert len(result["suggestions"]) == 5
+        assert result["resource_indices"] == [0, 1, 2]
+
+        answer = generate_followup_answer("I feel lonely", "Where do I start?", {})
+        print(f"Follow-up answer: {answer}")
+        assert answer and not answer.startswith("Answer:")
+        assert len(client.prompts) == 2
+        assert app.llm_slots.acquire(blocking=False)
+        app.llm_slots.release()
+    finally:
+        restore()
+    print()
+
+
+def test_support_response_cache():
+    print("Testing support response cache...")
+    print("=" * 50)
+
+    restore = use_stub_backend()
+    saved = app.SUPPORT_CACHE_DB, app._support_cache_db, app.SUPPORT_CACHE_TTL
+    try:
+        app.SUPPORT_CACHE_DB = os.path.join(tempfile.mkdtemp(), "cache.db")
+        app._support_cache_db = None
+        client = get_llm_client()
+        profile = {"display_name": "Sam", "primary_challenge": ["anxiety"]}
+
+        first = generate_support_response("Exams are stressing me out", profile)
+        first["suggestions"].clear()
+        second = generate_support_response("Exams are stressing me out", profile)
+        assert len(client.prompts) == 1
+        assert len(second["suggestions"]) == 5
+
+        generate_support_response("Exams are stressing me out", {"display_name": "Sam"})
+        assert len(client.prompts) == 2
+
+        # Entries persist across a cleared in-memory cache
+        app.support_response_cache.clear()
+        generate_support_response("Exams are stressing me out", profile)
+        assert len(client.prompts) == 2
+
+        # Expired entries are regenerated
+        app.SUPPORT_CACHE_TTL = -1
+        app.support_response_cache.clear()
+        app._support_cache_db.execute("DELETE FROM support_response_cache")
+        generate_support_response("Exams are stressing me out", profile)
+        generate_support_response("Exams are stressing me out", profile)
+        assert len(client.prompts) == 4
+        print(f"LLM calls: {len(client.prompts)}")
+    finally:
+        if app._support_cache_db is not None:
+            app._support_cache_db.close()
+        app.SUPPORT_CACHE_DB, app._support_cache_db, app.SUPPORT_CACHE_TTL = saved
+        restore()
+    print()
+
+
+def test_streaming_responses():
+    print("Testing streaming responses...")
+    print("=" * 50)
+
+    reply = (
+        "MESSAGE: You are not alone in this.\n\n"
+        "SUGGESTIONS:\n1. Talk to a friend\n2. Take a short walk\n\n"
+        "RESOURCES: 2, 40, 3"
+    )
+    parser = SupportResponseParser()
+    events = []
+    for i in range(0, len(reply), 3):
+        events += parser.feed(reply[i:i + 3])
+    events += parser.finish()
+    kinds = [kind for kind, _ in events]
+    assert kinds.index("message") < kinds.index("suggestion") < kinds.index("resources")
+    assert "".join(text for kind, text in events if kind == "message_delta").strip() == "You are not alone in this."
+    assert [text for kind, text in events if kind == "suggestion"] == ["Talk to a friend", "Take a short walk"]
+    assert parser.result() == {
+        "message": "You are not alone in this.",
+        "suggestions": ["Talk to a friend", "Take a short walk"],
+        "resource_indices": [1, 2],
+    }
+
+    restore = use_stub_backend()
+    try:
+        client = get_llm_client()
+        events = list(stream_support_response("I can't sleep before exams", {}))
+        assert events[-1][0] == "result" and len(events[-1][1]["suggestions"]) == 5
+        # The streamed result is cached for the blocking call
+        assert generate_support_response("I can't sleep before exams", {}) == events[-1][1]
+        assert len(client.prompts) == 1
+
+        answer = "".join(stream_followup_answer("I can't sleep", "What helps?", {}))
+        assert answer == generate_followup_answer("I can't sleep", "What helps?", {})
+        assert len(client.prompts) == 2
+        print(f"Streamed {len(events)} events; follow-up: {answer[:40]}...")
+
+        # A failed stream falls back to the mock instead of calling the LLM again
+        def broken_stream(prompt, max_tokens):
+            client.prompts.append(prompt)
+            raise ConnectionError("stream dropped")
+            yield
+
+        client.stream = broken_stream
+        flask_client = app.app.test_client()
+        with flask_client.session_transaction() as sess:
+            sess["user_id"] = -1
+            sess["display_name"] = "Sam"
+            sess["current_issue"] = "I feel homesick this week"
+        body = flask_client.get("/resources/stream").get_data(as_text=True)
+        assert "event: done" in body
+        assert len(client.prompts) == 3
+    finally:
+        restore()
+    print()
+
+
+def test_llm_call_guard():
+    print("Testing recommendation-only path and LLM call guard...")
+    print("=" * 50)
+
+    restore = use_stub_backend()
+    try:
+        client = get_llm_client()
+        app.llm_discarded_calls.clear()
+
+        # /decision only needs group recommendations, so it must not call the LLM
+        flask_client = app.app.test_client()
+        with flask_client.session_transaction() as sess:
+            sess["user_id"] = -1
+            sess["display_name"] = "Sam"
+            sess["current_issue"] = "I miss my family and have an exam"
+        response = flask_client.get("/decision")
+        assert response.status_code == 200
+        assert client.prompts == []
+        assert app.llm_discarded_calls == {}
+
+        # A route that calls the LLM but is not marked as consuming it is flagged
+        with app.app.test_request_context("/decision"):
+            app.app.preprocess_request()
+            generate_support_response("I feel lonely", {})
+            app.app.process_response(app.app.response_class(""))
+        with app.app.test_request_context("/resources"):
+            app.app.preprocess_request()
+            generate_support_response("I can't sleep", {})
+            app.app.process_response(app.app.response_class(""))
+        assert app.llm_discarded_calls == {"decision": 1}
+
+        # Calls from executor workers are counted against the request
+        with app.app.test_request_context("/decision"):
+            app.app.preprocess_request()
+            app.gather_recommendation_sources({
+                "support": (lambda: generate_support_response("I miss home", {}), 5.0, dict),
+            })
+            app.app.process_response(app.app.response_class(""))
+        assert app.llm_discarded_calls == {"decision": 2}
+
+        # So are calls from a streamed body, which runs after the request has ended
+        def body():
+            generate_support_response("I feel stuck", {})
+            yield "done"
+
+        with app.app.test_request_context("/decision"):
+            app.app.preprocess_request()
+            response = app.app.process_response(app.app.response_class(body()))
+        assert app.llm_discarded_calls == {"decision": 2}
+        assert list(response.response) == ["done"]
+        print(f"Discarded calls: {app.llm_discarded_calls}")
+        assert app.llm_discarded_calls == {"decision": 3}
+    finally:
+        app.llm_discarded_calls.clear()
+        restore()
+    print()
+
+
+def test_recommendation_fanout():
+    print("Testing parallel recommendation sources...")
+    print("=" * 50)
+
+    def slow(value, delay):
+        def run():
+            time.sleep(delay)
+            return value
+        return run
+
+    start = time.monotonic()
+    results = app.gather_recommendation_sources({
+        "support": (slow("ai", 0.3), 1.0, lambda: "mock"),
+        "semantic": (slow(["Making Friends"], 0.3), 1.0, list),
+        "followup": (slow("late answer", 2.0), 0.5, lambda: "fallback"),
+        "broken": (lambda: 1 / 0, 1.0, lambda: "recovered"),
+    })
+    elapsed = time.monotonic() - start
+    print(f"Results: {results} in {elapsed:.2f}s")
+    assert results == {
+        "support": "ai",
+        "semantic": ["Making Friends"],
+        "followup": "fallback",
+        "broken": "recovered",
+    }
+    # Sources overlap: the call lasts about as long as the longest deadline
+    assert 0.45 < elapsed < 0.9
+
+    # The page budget caps every source's deadline
+    results = app.gather_recommendation_sources(
+        {"support": (slow("ai", 0.5), 5.0, lambda: "mock")}, budget=0.1
+    )
+    assert results == {"support": "mock"}
+    print()
+
+
+if __name__ == "__main__":
+    test_llm_client()
+    test_support_response_cache()
+    test_streaming_responses()
+    test_llm_call_guard()
+    test_recommendation_fanout()
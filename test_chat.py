@@ -0,0 +1,134 @@
+"""Test the in-memory chat message store."""
+import sys
+sys.path.insert(0, ".")
+
+import threading
+import time
+
+import app
+from app import ChatArchive, MessageLog
+
+
+def make_message(i):
+    return {"id": f"m{i}", "user_id": 1, "text": f"hello {i}"}
+
+
+def test_message_log():
+    print("Testing message log...")
+    print("=" * 50)
+
+    log = MessageLog("room", archive=ChatArchive(":memory:"))
+    for i in range(10):
+        log.append(make_message(i))
+    log.append({"id": "s0", "display_name": "System", "text": "someone left", "is_system": True})
+
+    assert log.edit("m3", "edited")["edited"]
+    assert log.get("m3")["text"] == "edited"
+    assert log.delete("m4")["text"] == "hello 4"
+    assert log.get("m4") is None and log.delete("m4") is None
+
+    recent = [msg["id"] for msg in log.recent(4)]
+    assert recent == ["m7", "m8", "m9", "s0"], recent
+    assert "m4" not in [msg["id"] for msg in log.recent(50)]
+    print(f"Recent after delete: {recent}")
+    print()
+
+
+def test_message_spill():
+    print("Testing message spill to archive...")
+    print("=" * 50)
+
+    saved = app.MESSAGE_HOT_LIMIT, app.MESSAGE_SPILL_BATCH
+    app.MESSAGE_HOT_LIMIT, app.MESSAGE_SPILL_BATCH = 20, 10
+    try:
+        archive = ChatArchive(":memory:")
+        log = MessageLog("room", archive=archive)
+        for i in range(100):
+            log.append(make_message(i))
+        assert len(log.entries) < 30
+        print(f"Hot entries: {len(log.entries)}, archived from position {log.base}")
+
+        # Archived messages can still be edited and deleted
+        assert log.edit("m5", "edited")["text"] == "edited"
+        assert log.get("m5")["edited"]
+        log.delete("m6")
+        log.delete("m95")
+
+        ids = [msg["id"] for msg in log.recent(50)]
+        assert ids == [f"m{i}" for i in range(49, 100) if i != 95], ids
+
+        earlier = [msg["id"] for msg in log.earlier("m12", 5)]
+        assert earlier == ["m7", "m8", "m9", "m10", "m11"], earlier
+        earlier = [msg["id"] for msg in log.earlier("m7", 5)]
+        assert earlier == ["m1", "m2", "m3", "m4", "m5"], earlier
+        print(f"Earlier than m7: {earlier}")
+
+        # A new log for the same room resumes after the archived positions
+        restarted = MessageLog("room", archive=archive)
+        restarted.append(make_message(100))
+        assert restarted.base == log.base
+        assert [msg["id"] for msg in restarted.recent(2)] == ["m79", "m100"]
+    finally:
+        app.MESSAGE_HOT_LIMIT, app.MESSAGE_SPILL_BATCH = saved
+    print()
+
+
+def test_message_changes():
+    print("Testing incremental message changes...")
+    print("=" * 50)
+
+    log = MessageLog("room", archive=ChatArchive(":memory:"))
+    for i in range(5):
+        log.append(make_message(i))
+    start = log.seq
+    assert log.changes_since(start) == ([], [])
+
+    log.append(make_message(5))
+    log.edit("m1", "edited")
+    log.delete("m2")
+    log.edit("m5", "edited again")
+    messages, deleted = log.changes_since(start)
+    assert [msg["id"] for msg in messages] == ["m1", "m5"], messages
+    assert deleted == ["m2"]
+    assert messages[-1]["seq"] == log.seq
+    print(f"Changed: {[msg['id'] for msg in messages]}, deleted: {deleted}")
+
+    # Cursors outside the change log ask the client to reset
+    assert log.changes_since(log.seq + 1) is None
+    assert log.changes_since(start - 100) is None
+    print()
+
+
+def test_wait_for_change():
+    print("Testing change notification...")
+    print("=" * 50)
+
+    log = MessageLog("room", archive=ChatArchive(":memory:"))
+    start = log.seq
+    assert not log.wait_for_change(start, 0.05)
+
+    woken = []
+
+    def waiter():
+        began = time.monotonic()
+        woken.append((log.wait_for_change(start, 5), time.monotonic() - began))
+
+    threads = [threading.Thread(target=waiter) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    log.append(make_message(0))
+    for thread in threads:
+        thread.join()
+
+    assert [ok for ok, _ in woken] == [True, True, True]
+    assert max(elapsed for _, elapsed in woken) < 1
+    print(f"Woke {len(woken)} waiters after {max(e for _, e in woken):.3f}s")
+    print()
+
+
+if __name__ == "__main__":
+    test_message_log()
+    test_message_spill()
+    test_message_changes()
+    test_wait_for_change()
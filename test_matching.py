@@ -0,0 +1,314 @@
+"""Test profile match scoring and profile loading."""
+import sys
+sys.path.insert(0, ".")
+
+import os
+import random
+import sqlite3
+import tempfile
+
+import app
+from app import (
+    calculate_match_score,
+    encode_profile_bits,
+    bulk_match_scores,
+    rank_indices,
+    SUPPORT_TOPIC_INDEX,
+)
+
+
+def random_profile(rng):
+    topics = list(SUPPORT_TOPIC_INDEX) + ["loneliness", "academics", ""]
+    return {
+        "primary_challenge": rng.sample(topics, rng.randint(0, 3)),
+        "support_topics": rng.sample(topics, rng.randint(0, 4)),
+        "private_topics": rng.sample(topics, rng.randint(0, 2)),
+        "languages": rng.sample(["English", "Spanish", "Hindi", "Mandarin"], rng.randint(0, 2)),
+        "preferred_language": rng.choice(["", "English", "Arabic"]),
+        "cultural_background": rng.sample(["South Asia", "East Asia", "Latin America"], rng.randint(0, 2)),
+        "gender": rng.choice(["", "male", "female", "prefer-not-to-say"]),
+        "graduation_year": rng.choice(["", "2026", "2027", "2030+"]),
+        "degree_program": rng.choice(["", "bachelors", "masters"]),
+    }
+
+
+def test_bulk_match_scores():
+    print("Testing bulk match scoring...")
+    print("=" * 50)
+
+    rng = random.Random(7)
+    current = random_profile(rng)
+    population = [random_profile(rng) for _ in range(300)]
+
+    expected = [calculate_match_score(current, peer) for peer in population]
+    bulk = bulk_match_scores(
+        encode_profile_bits(current),
+        [encode_profile_bits(peer) for peer in population],
+    ).tolist()
+    print(f"First scores: {bulk[:10]}")
+    assert bulk == expected
+    print("bulk_match_scores: OK")
+
+    # Partial ranking agrees with a full stable sort
+    order = sorted(range(len(expected)), key=lambda i: expected[i], reverse=True)
+    assert list(rank_indices(expected)) == order
+    assert list(rank_indices(expected, k=3)) == order[:3]
+
+    # /people pages picked by rank_indices follow people_sort_key exactly
+    peers = [{"user_id": rng.randint(1, 2 ** 31), "match_score": score} for score in expected]
+    for sort_by in ("best", "recent"):
+        full = sorted(peers, key=lambda p: app.people_sort_key(p, sort_by))
+        keys = [app.people_rank_key(p, sort_by) for p in peers]
+        assert [peers[i] for i in rank_indices(keys, k=20)] == full[:20]
+    print("rank_indices: OK")
+
+    # The bulk path reads and fills the per-pair cache
+    peers = [(10_000 + i, peer) for i, peer in enumerate(population)]
+    try:
+        assert app.score_peer_profiles(9_999, current, peers) == expected
+        cached = [key for key in app.match_score_cache if key[0] == 9_999]
+        assert len(cached) == len(peers)
+        app.match_score_cache[cached[0]] = -1
+        assert app.score_peer_profiles(9_999, current, peers)[0] == -1
+    finally:
+        app.bump_profile_version(9_999)
+        app.profile_versions.pop(9_999, None)
+    assert not any(key[0] == 9_999 for key in app.match_score_cache)
+    print("score_peer_profiles cache: OK")
+
+    # A viewer's full profile and their trimmed peer row are cached apart, so
+    # scores do not depend on who viewed the page first
+    def trimmed(profile):
+        return {k: v for k, v in profile.items() if k not in ("graduation_year", "degree_program")}
+
+    a = {"support_topics": ["loneliness"], "graduation_year": "2026", "degree_program": "Biology"}
+    b = {"support_topics": ["loneliness"], "graduation_year": "2026", "degree_program": "Biology"}
+    c = {"support_topics": ["homesickness"]}
+    ids = (20_001, 20_002, 20_003)
+    try:
+        app.score_peer_profiles(ids[0], a, [(ids[2], c)])
+        app.score_peer_profiles(ids[1], b, [(ids[2], c)])
+        expected = calculate_match_score(a, trimmed(b))
+        assert app.score_peer_profiles(ids[0], a, [(ids[1], trimmed(b))]) == [expected]
+        assert app.get_match_score(ids[1], b, ids[0], trimmed(a)) == calculate_match_score(b, trimmed(a))
+    finally:
+        for uid in ids:
+            app.bump_profile_version(uid)
+            app.profile_versions.pop(uid, None)
+    print("visit order: OK")
+
+    # Free-form values beyond the vocabulary cap share hashed bits
+    saved = {kind: dict(bits) for kind, bits in app.profile_value_bits.items()}
+    try:
+        flood = [{"languages": [f"Language {i}"], "cultural_background": [f"Culture {i}"]} for i in range(1000)]
+        bits_list = [encode_profile_bits(profile) for profile in flood]
+        assert len(app.profile_value_bits["language"]) <= app.PROFILE_VALUE_BITS
+        assert max(bits.languages.bit_length() for bits in bits_list) <= app.PROFILE_VALUE_BITS
+        assert encode_profile_bits(flood[-1]) == bits_list[-1]
+        assert bulk_match_scores(bits_list[-1], bits_list).tolist() == [
+            calculate_match_score(flood[-1], profile) for profile in flood
+        ]
+    finally:
+        for kind, bits in saved.items():
+            app.profile_value_bits[kind].clear()
+            app.profile_value_bits[kind].update(bits)
+    print("value vocabulary cap: OK")
+
+
+def test_batched_profile_loader():
+    print("Testing batched profile loader and profile cache...")
+    print("=" * 50)
+
+    original_db = app.DATABASE
+    app.DATABASE = os.path.join(tempfile.mkdtemp(), "profiles.db")
+    try:
+        app.init_db()
+        with app.app.test_request_context():
+            for uid in range(1, 201):
+                app.save_profile_to_db(uid, {"display_name": f"Member {uid}", "support_topics": ["loneliness"]})
+        # Saves write through to the process-wide cache
+        assert app.user_profiles[7]["support_topics"] == ("loneliness",)
+        app.user_profiles.clear()
+
+        with app.app.test_request_context():
+            queries = []
+            app.get_db().set_trace_callback(queries.append)
+            profiles = app.load_profiles_from_db(list(range(1, 201)) + [999])
+            assert len(profiles) == 200 and 999 not in profiles
+            assert profiles[7]["display_name"] == "Member 7"
+            print(f"200 members loaded with {len(queries)} query")
+            assert len(queries) == 1
+
+            # Repeat lookups, including misses, are served from the request memo
+            assert app.load_profile_from_db(7) is profiles[7]
+            assert app.load_profile_from_db(999) is None
+            assert len(queries) == 1
+
+            # Cached profiles are read-only
+            try:
+                profiles[7]["display_name"] = "Changed"
+                assert False, "profile should be immutable"
+            except TypeError:
+                pass
+
+            # Saving replaces the cached profile with what a reload would return
+            app.save_profile_to_db(7, {"display_name": "Renamed", "languages": ["English", "Hindi"]})
+            renamed = app.load_profile_from_db(7)
+            assert renamed["display_name"] == "Renamed"
+            assert renamed["languages"] == ("English", "Hindi")
+
+        with app.app.test_request_context():
+            # Later requests are served from the process-wide cache, after a
+            # check of the cached revisions
+            queries = []
+            app.get_db().set_trace_callback(queries.append)
+            assert app.load_profile_from_db(7) == renamed
+            assert len(app.load_profiles_from_db(range(1, 201))) == 200
+            assert len(queries) == 2 and all("SELECT user_id, revision" in q for q in queries)
+            fresh = app.profile_from_row(app.get_db().execute(
+                "SELECT * FROM profiles WHERE user_id = 7").fetchone())
+            assert app.freeze_profile(fresh) == renamed
+
+        # A save made by another worker process is picked up
+        other = sqlite3.connect(app.DATABASE)
+        other.execute("UPDATE profiles SET display_name = 'Elsewhere', revision = revision + 1 WHERE user_id = 9")
+        other.commit()
+        other.close()
+        with app.app.test_request_context():
+            assert app.load_profile_from_db(9)["display_name"] == "Elsewhere"
+        with app.app.test_request_context():
+            queries = []
+            app.get_db().set_trace_callback(queries.append)
+            app.PROFILE_CACHE_CHECK_DB = False
+            try:
+                assert app.load_profile_from_db(9)["display_name"] == "Elsewhere"
+            finally:
+                app.PROFILE_CACHE_CHECK_DB = True
+            assert queries == []
+
+        # A stale entry (older profile version) is a miss
+        saved_version = app.profile_versions.get(8)
+        app.bump_profile_version(8)
+        assert 8 not in app.user_profiles
+        if saved_version is None:
+            del app.profile_versions[8]
+        else:
+            app.profile_versions[8] = saved_version
+
+        # The cache is bounded, evicting least recently used profiles
+        cache = app.ProfileCache(2)
+        for uid in (1, 2, 3):
+            cache.put(uid, {"display_name": str(uid)}, app.get_profile_version(uid))
+        assert 1 not in cache and len(cache) == 2
+    finally:
+        app.DATABASE = original_db
+        app.user_profiles.clear()
+    print()
+
+
+def test_profile_loader_old_schema():
+    print("Testing profile load/save on a database without the revision column...")
+    print("=" * 50)
+
+    original_db = app.DATABASE
+    app.DATABASE = os.path.join(tempfile.mkdtemp(), "old.db")
+    try:
+        # The profiles schema of the shipped auth.db, before init_db migrates it
+        db = sqlite3.connect(app.DATABASE)
+        db.execute("""
+            CREATE TABLE profiles (
+                user_id INTEGER PRIMARY KEY,
+                display_name TEXT,
+                gender TEXT DEFAULT '',
+                preferred_language TEXT DEFAULT '',
+                primary_challenge TEXT DEFAULT '',
+                support_style TEXT DEFAULT 'mixed',
+                support_topics TEXT DEFAULT '',
+                private_topics TEXT DEFAULT '',
+                languages TEXT DEFAULT '',
+                cultural_background TEXT DEFAULT '',
+                onboarding_complete INTEGER DEFAULT 0, graduation_year TEXT DEFAULT "", degree_program TEXT DEFAULT ""
+            )
+        """)
+        db.execute("INSERT INTO profiles (user_id, display_name) VALUES (1, 'Old Member')")
+        db.commit()
+        db.close()
+        app.user_profiles.clear()
+
+        with app.app.test_request_context():
+            assert app.load_profile_from_db(1)["display_name"] == "Old Member"
+            app.save_profile_to_db(2, {"display_name": "New Member", "support_topics": ["loneliness"]})
+        with app.app.test_request_context():
+            # Cached entries are served without a revision check
+            assert app.load_profile_from_db(1)["display_name"] == "Old Member"
+            assert app.load_profile_from_db(2)["support_topics"] == ("loneliness",)
+
+        # Once migrated, saves start counting revisions
+        app.init_db()
+        with app.app.test_request_context():
+            app.save_profile_to_db(2, {"display_name": "Renamed"})
+            assert app.get_db().execute("SELECT revision FROM profiles WHERE user_id = 2").fetchone()[0] == 1
+            assert app.load_profile_from_db(2)["display_name"] == "Renamed"
+        print("old schema: OK")
+    finally:
+        app.profile_revision_columns.pop(app.DATABASE, None)
+        app.DATABASE = original_db
+        app.user_profiles.clear()
+    print()
+
+
+def test_profile_index_other_workers():
+    print("Testing inverted profile index freshness across workers...")
+    print("=" * 50)
+
+    original_db = app.DATABASE
+    app.DATABASE = os.path.join(tempfile.mkdtemp(), "index.db")
+    saved = (dict(app.profile_index_state), dict(app.profile_index_entries),
+             {field: {value: set(ids) for value, ids in values.items()} for field, values in app.profile_index.items()})
+    app.profile_index_entries.clear()
+    for values in app.profile_index.values():
+        values.clear()
+    try:
+        app.init_db()
+        db = sqlite3.connect(app.DATABASE)
+        for uid in (1, 2):
+            db.execute("INSERT INTO users (id, username, password_hash, created_at) VALUES (?, ?, '', '')",
+                       (uid, f"member{uid}"))
+        db.commit()
+        app.profile_index_state.update(loaded=False, revision=0)
+        with app.app.test_request_context():
+            app.save_profile_to_db(1, {"display_name": "Here", "support_topics": ["loneliness"]})
+            app.ensure_profile_index()
+            assert app.find_profile_candidates({"topic": ["loneliness_isolation"]}) == {1}
+
+        # Another worker saves a profile straight to the database
+        db.execute("""
+            INSERT INTO profiles (user_id, display_name, support_topics, revision)
+            VALUES (2, 'Elsewhere', 'loneliness', (SELECT MAX(revision) FROM profiles) + 1)
+        """)
+        db.execute("UPDATE profiles SET support_topics = 'homesickness', "
+                   "revision = (SELECT MAX(revision) FROM profiles) + 1 WHERE user_id = 1")
+        db.commit()
+        db.close()
+        with app.app.test_request_context():
+            assert app.find_profile_candidates({"topic": ["loneliness_isolation"]}) == {2}
+            assert app.find_profile_candidates({"topic": ["homesickness"]}) == {1}
+        print("profile index freshness: OK")
+    finally:
+        app.profile_index_state.update(saved[0])
+        app.profile_index_entries.clear()
+        app.profile_index_entries.update(saved[1])
+        for field, values in app.profile_index.items():
+            values.clear()
+            values.update(saved[2][field])
+        app.profile_revision_columns.pop(app.DATABASE, None)
+        app.DATABASE = original_db
+        app.user_profiles.clear()
+    print()
+
+
+if __name__ == "__main__":
+    test_bulk_match_scores()
+    test_batched_profile_loader()
+    test_profile_loader_old_schema()
+    test_profile_index_other_workers()
@@ -0,0 +1,187 @@
+"""Test the moderation lexicon matcher."""
+import os
+import sys
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.insert(0, ".")
+
+import app
+from app import (
+    groups,
+    ChatArchive,
+    MessageLog,
+    moderation_matcher,
+    ai_moderate_messages,
+    rescan_room_history,
+    moderate_chat_message,
+    review_message,
+    detect_offensive_language,
+    detect_severe_distress,
+    check_profanity,
+)
+
+
+def test_moderation_matcher():
+    print("Testing moderation matcher...")
+    print("=" * 50)
+
+    cases = {
+        "hey everyone, how was the midterm?": set(),
+        "you're such an idiot": {"profanity", "profanity_substr"},
+        "Hello from class": {"profanity_substr"},
+        "I HATE   YOU": {"offensive"},
+        "go to hell, I want to die": {"offensive", "profanity", "profanity_substr", "severe_distress"},
+        "f u c k this": {"offensive"},
+        "sometimes I think about self-harm": {"severe_distress"},
+        "better off deadamn": {"severe_distress", "profanity_substr"},
+    }
+    for text, expected in cases.items():
+        hits = moderation_matcher.scan(text)
+        print(f"{text!r}: {sorted(hits)}")
+        assert hits == expected, (text, hits)
+
+    assert detect_offensive_language("you moron")
+    assert not detect_offensive_language("Hello from class")
+    assert check_profanity("Hello from class")
+    assert detect_severe_distress("No reason to live")
+    print()
+
+
+def test_batch_moderation():
+    print("Testing batch moderation...")
+    print("=" * 50)
+
+    texts = ["see you at the study group", "you idiot", "see you at the study group", "I want to die", ""]
+    hits = moderation_matcher.scan_many(texts)
+    assert hits == [moderation_matcher.scan(text) for text in texts]
+
+    verdicts = ai_moderate_messages(texts)
+    print(f"Reasons: {[v['reason'] for v in verdicts]}")
+    assert [v["allowed"] for v in verdicts] == [True, False, True, True, True]
+    assert verdicts[3]["reason"] == "severe_distress"
+
+    room = MessageLog("rescan-test", archive=ChatArchive(":memory:"))
+    for i in range(450):
+        text = "you moron" if i % 100 == 7 else f"message {i}"
+        if i % 64 == 13:
+            # Legacy messages without an id are skipped, even at page edges
+            room.append({"user_id": 1, "text": "you moron"})
+        room.append({"id": f"m{i}", "user_id": 1, "text": text})
+    groups["rescan-test"] = room
+    try:
+        removed = rescan_room_history("rescan-test", batch_size=64)
+    finally:
+        del groups["rescan-test"]
+    print(f"Removed: {sorted(removed)}")
+    assert sorted(removed) == ["m107", "m207", "m307", "m407", "m7"]
+    assert room.get("m7") is None and room.get("m8") is not None
+
+    # A whole page of id-less messages does not stop the scan short
+    room = MessageLog("rescan-legacy", archive=ChatArchive(":memory:"))
+    room.append({"id": "old", "user_id": 1, "text": "you moron"})
+    for i in range(100):
+        room.append({"user_id": 1, "text": f"legacy {i}"})
+    for i in range(10):
+        room.append({"id": f"new{i}", "user_id": 1, "text": f"message {i}"})
+    groups["rescan-legacy"] = room
+    try:
+        assert rescan_room_history("rescan-legacy", batch_size=32) == ["old"]
+    finally:
+        del groups["rescan-legacy"]
+    print()
+
+
+class FakeModerator(BaseHTTPRequestHandler):
+    """Minimal live moderation endpoint for the optimistic pipeline test."""
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        text = payload["message_text"]
+        if "remote-bad" in text:
+            verdict = {"allowed": False, "reason": "harassment", "user_message": "Removed"}
+        elif "remote-sad" in text:
+            verdict = {"allowed": True, "reason": "severe_distress", "user_message": text}
+        else:
+            verdict = {"allowed": True, "reason": "ok", "user_message": text}
+        body = json.dumps(verdict).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_optimistic_moderation():
+    print("Testing optimistic moderation...")
+    print("=" * 50)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeModerator)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    saved = {k: os.environ.get(k) for k in ("LIVE_AI", "AI_ENDPOINT_URL", "AI_ENDPOINT_KEY")}
+    os.environ.update({
+        "LIVE_AI": "1",
+        "AI_ENDPOINT_URL": f"http://127.0.0.1:{server.server_port}",
+        "AI_ENDPOINT_KEY": "test",
+    })
+    room = MessageLog("optimistic-test", archive=ChatArchive(":memory:"))
+    groups["optimistic-test"] = room
+    try:
+        verdict, deferred = moderate_chat_message("you idiot")
+        assert not verdict["allowed"] and not deferred
+
+        for msg_id in ("ok", "remote-bad", "remote-sad"):
+            verdict, deferred = moderate_chat_message(f"hello {msg_id}")
+            assert verdict["allowed"] and deferred
+            room.append({"id": msg_id, "user_id": 1, "text": verdict["user_message"]})
+            review_message("optimistic-test", msg_id, verdict["user_message"])
+
+        assert room.get("remote-bad") is None
+        assert room.get("remote-sad")["flagged"] == "severe_distress"
+        assert "flagged" not in room.get("ok")
+        print(f"Kept: {[msg['id'] for msg in room.recent(10)]}")
+    finally:
+        del groups["optimistic-test"]
+        server.shutdown()
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    print()
+
+
+def test_batch_moderation_limits():
+    print("Testing batch moderation limits...")
+    print("=" * 50)
+
+    client = app.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = -7
+    app.moderation_usage.pop(-7, None)
+    try:
+        too_many = client.post("/api/moderate/batch", json={"texts": ["hi"] * (app.MODERATION_BATCH_LIMIT + 1)})
+        assert too_many.get_json()["success"] is False
+
+        sent = 0
+        while sent + app.MODERATION_BATCH_LIMIT <= app.MODERATION_RATE_LIMIT:
+            response = client.post("/api/moderate/batch", json={"texts": ["hi"] * app.MODERATION_BATCH_LIMIT})
+            assert response.get_json()["success"]
+            sent += app.MODERATION_BATCH_LIMIT
+        # The per-minute budget is spent
+        response = client.post("/api/moderate/batch", json={"texts": ["hi"] * app.MODERATION_BATCH_LIMIT})
+        print(f"After {sent} texts: {response.status_code}")
+        assert response.status_code == 429
+    finally:
+        app.moderation_usage.pop(-7, None)
+    print()
+
+
+if __name__ == "__main__":
+    test_moderation_matcher()
+    test_batch_moderation()
+    test_batch_moderation_limits()
+    test_optimistic_moderation()
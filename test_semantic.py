@@ -1,5 +1,6 @@
 """Test semantic matching functions."""
 import sys
+import time
 sys.path.insert(0, ".")
 
 from app import (
@@ -14,6 +15,14 @@ from app import (
     user_embeddings,
     group_embeddings,
     init_group_embeddings,
+    get_top_matches,
+    EmbeddingStore,
+    IVFIndex,
+    cache_embedding,
+    embed_texts,
+    save_embedding_store,
+    load_embedding_store,
+    LocalMiniLMEncoder,
     PRESET_GROUPS
 )
 
@@ -112,5 +121,364 @@ def test_semantic_functions():
     print("=" * 50)
     print("All semantic matching tests passed!")
 
+def test_embedding_store():
+    print("Testing EmbeddingStore...")
+    print("=" * 50)
+
+    vectors = {
+        "a": [1.0, 0.0, 0.0],
+        "b": [0.9, 0.1, 0.0],
+        "c": [0.0, 1.0, 0.0],
+        "d": [0.5, 0.5, 0.5],
+    }
+    store = EmbeddingStore()
+    for key, vec in vectors.items():
+        store.add(key, vec)
+    assert len(store) == 4
+
+    query = [1.0, 0.2, 0.0]
+    expected = get_top_matches(query, vectors, top_n=3, threshold=0.1)
+    result = store.top_k(query, top_n=3, threshold=0.1)
+    print(f"Exact scan: {expected}")
+    print(f"Store top_k: {result}")
+    assert [k for k, _ in result] == [k for k, _ in expected]
+    for (_, s1), (_, s2) in zip(result, expected):
+        assert abs(s1 - s2) < 1e-5
+
+    # Exclusion, removal and replacement keep the id <-> row map consistent
+    assert "a" not in [k for k, _ in store.top_k(query, top_n=3, threshold=0.1, exclude="a")]
+    store.remove("a")
+    assert "a" not in store and len(store) == 3
+    store.add("c", query)
+    assert store.top_k(query, top_n=1, threshold=0.1)[0][0] == "c"
+
+    # A vector from a different model (other dimension) is rejected, not mixed in
+    assert not store.add("d", [1.0, 0.0])
+    assert "d" not in store and store.dim == 3
+    print("EmbeddingStore: OK")
+
+
+def test_ivf_index():
+    print("Testing IVFIndex...")
+    print("=" * 50)
+    import numpy as np
+
+    rng = np.random.default_rng(42)
+    store = EmbeddingStore()
+    store.index = IVFIndex(store, nprobe=4, min_train_size=200)
+    for i in range(400):
+        store.add(i, rng.normal(size=16))
+    # Training runs in the background once min_train_size is reached
+    assert store.index.wait(5)
+    assert store.index.is_trained
+
+    report = store.index.measure_recall(top_n=5, sample=50)
+    print(f"Recall report (nprobe=4): {report}")
+    assert 0.0 < report["recall"] <= 1.0
+
+    # Probing every bucket must reproduce the exact scan
+    store.index.nprobe = len(store.index.lists)
+    assert store.index.measure_recall(top_n=5, sample=50)["recall"] == 1.0
+
+    # Incremental delete and insert keep buckets in sync with the store
+    store.remove(0)
+    assert 0 not in store.index.assignments
+    store.add(1000, rng.normal(size=16))
+    assert 1000 in store.index.assignments
+
+    # Doubling the store retrains off the write path; keys added and removed
+    # meanwhile are bucketed into the new index
+    trained_size = store.index.trained_size
+    for i in range(400, 2 * trained_size + 50):
+        store.add(i, rng.normal(size=16))
+    store.remove(5)
+    assert store.index.wait(5)
+    assert store.index.trained_size > trained_size
+    assert set(store.index.assignments) == set(store.ids)
+    assert sorted(key for bucket in store.index.lists for key in bucket) == sorted(store.ids)
+    print("IVFIndex: OK")
+
+
+def test_embedding_store_concurrency():
+    print("Testing EmbeddingStore under concurrent writes...")
+    print("=" * 50)
+    import numpy as np
+
+    rng = np.random.default_rng(3)
+    vectors = rng.normal(size=(300, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1)[:, None]
+    for indexed in (False, True):
+        check_store_under_churn(vectors, rng, indexed)
+    print("EmbeddingStore concurrency: OK")
+
+
+def check_store_under_churn(vectors, rng, indexed):
+    import threading
+    import numpy as np
+
+    store = EmbeddingStore()
+    if indexed:
+        # Trained while the store fills, so the churn runs against a live index
+        store.index = IVFIndex(store, nprobe=2, min_train_size=50)
+    for key in range(200):
+        store.add(key, vectors[key])
+
+    stop = threading.Event()
+
+    def churn():
+        # Swap-removes and re-adds, as the embedding refresh worker does
+        writer_rng = np.random.default_rng(4)
+        while not stop.is_set():
+            key = int(writer_rng.integers(300))
+            if key in store:
+                store.remove(key)
+            else:
+                store.add(key, vectors[key])
+
+    writer = threading.Thread(target=churn)
+    writer.start()
+    errors = []
+    try:
+        deadline = time.monotonic() + 0.5
+        while time.monotonic() < deadline:
+            query = vectors[int(rng.integers(300))]
+            for key, score in store.top_k(query, top_n=10, threshold=-1.0):
+                # Every result must be scored against its own row
+                if abs(score - float(vectors[key] @ query)) > 1e-4:
+                    errors.append(key)
+    finally:
+        stop.set()
+        writer.join()
+    assert errors == []
+    if indexed:
+        assert store.index.wait(5)
+        assert set(store.index.assignments) == set(store.ids)
+
+
+def test_embedding_cache():
+    print("Testing embedding cache...")
+    print("=" * 50)
+
+    profile_text = build_profile_text({"display_name": "Cached", "support_style": "mixed"})
+    cache_embedding(profile_text, [0.1, 0.2, 0.3])
+    # Cached texts resolve without a remote call, and duplicates share the entry
+    result = embed_texts([profile_text, profile_text])
+    print(f"Cached embeddings: {result}")
+    assert result == [[0.1, 0.2, 0.3], [0.1, 0.2, 0.3]]
+    print("embedding cache: OK")
+
+
+def test_embedding_persistence():
+    print("Testing embedding persistence...")
+    print("=" * 50)
+    import tempfile
+    import app
+
+    original_dir = app.EMBEDDINGS_DIR
+    app.EMBEDDINGS_DIR = tempfile.mkdtemp()
+    try:
+        store = EmbeddingStore()
+        store.add(1, [1.0, 0.0, 0.0])
+        store.add(2, [0.0, 2.0, 0.0])
+        assert save_embedding_store(store, "users")
+
+        restored = EmbeddingStore()
+        assert load_embedding_store(restored, "users") == 2
+        print(f"Restored ids: {restored.ids}")
+        assert restored.top_k([0.0, 1.0, 0.0], top_n=1)[0][0] == 2
+
+        # Memory-mapped rows stay writable for later inserts
+        restored.add(3, [0.0, 0.0, 1.0])
+        assert len(restored) == 3
+    finally:
+        app.EMBEDDINGS_DIR = original_dir
+    print("embedding persistence: OK")
+
+
+def test_embedding_flush():
+    print("Testing embedding snapshot flushes...")
+    print("=" * 50)
+    import os
+    import tempfile
+    import app
+
+    state = app._embedding_flush_state
+    saved = app.EMBEDDINGS_DIR, app.user_embedding_store, dict(state), set(state["loaded"])
+    app.EMBEDDINGS_DIR = tempfile.mkdtemp()
+    app.user_embedding_store = EmbeddingStore()
+    app.user_embedding_store.add(1, [1.0, 0.0, 0.0])
+    snapshot = os.path.join(app.EMBEDDINGS_DIR, "user_embeddings.npy")
+    try:
+        # A store that was never loaded back is not written over
+        state["loaded"] = set()
+        state["dirty"] = True
+        app.flush_embeddings(force=True)
+        assert not os.path.exists(snapshot)
+
+        state["loaded"] = {"user_embeddings"}
+        state["dirty"] = True
+        assert app.flush_embeddings(force=True)
+        assert os.path.exists(snapshot)
+        assert not [f for f in os.listdir(app.EMBEDDINGS_DIR) if ".tmp" in f]
+
+        # Write errors are logged, not raised, and leave the stores dirty
+        blocker = os.path.join(app.EMBEDDINGS_DIR, "blocked")
+        open(blocker, "w").close()
+        app.EMBEDDINGS_DIR = blocker
+        state["dirty"] = True
+        app.flush_embeddings(force=True)
+        assert state["dirty"]
+    finally:
+        app.EMBEDDINGS_DIR, app.user_embedding_store = saved[0], saved[1]
+        state.update(saved[2])
+        state["loaded"] = saved[3]
+    print("embedding flush: OK")
+
+
+def test_embedding_refresh_queue():
+    print("Testing background embedding refresh...")
+    print("=" * 50)
+    import os
+    import tempfile
+    import threading
+    import app
+
+    texts = {}
+    for name, vector in [("A", [1.0, 0.0]), ("B", [0.0, 1.0]), ("C", [0.6, 0.8]), ("D", [0.8, 0.6])]:
+        texts[name] = build_profile_text({"display_name": f"Queued {name}", "support_style": "mixed"})
+        cache_embedding(texts[name], vector)
+
+    batches = []
+    release = threading.Event()
+    original_refresh = app.refresh_user_embeddings
+
+    def recording_refresh(jobs):
+        batches.append(list(jobs))
+        release.wait(5)
+        original_refresh(jobs)
+
+    # Keep the fake users out of the real store and its snapshot directory
+    state = app._embedding_flush_state
+    saved = app.EMBEDDINGS_DIR, app.user_embedding_store, state["dirty"]
+    app.EMBEDDINGS_DIR = tempfile.mkdtemp()
+    app.user_embedding_store = EmbeddingStore()
+    path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+    app.refresh_user_embeddings = recording_refresh
+    try:
+        queue = app.EmbeddingRefreshQueue(path)
+        queue.enqueue(101, texts["A"])
+        while not batches:
+            time.sleep(0.01)
+        # Saves made while the first batch is in flight coalesce per user
+        queue.enqueue(101, texts["B"])
+        queue.enqueue(101, texts["C"])
+        queue.enqueue(102, texts["D"])
+        release.set()
+        assert queue.drain(timeout=5)
+        app.refresh_user_embeddings = original_refresh
+
+        print(f"Batches: {[[uid for uid, _ in batch] for batch in batches]}")
+        assert batches == [[(101, texts["A"])], [(101, texts["C"]), (102, texts["D"])]]
+        assert user_embeddings[101] == [0.6, 0.8]
+        assert user_embeddings[102] == [0.8, 0.6]
+        assert queue.db().execute("SELECT COUNT(*) FROM embedding_jobs").fetchone()[0] == 0
+
+        # Jobs left in the database by a previous process are replayed
+        queue.db().execute(
+            "INSERT INTO embedding_jobs (user_id, profile_text, queued_at) VALUES (?, ?, ?)",
+            (103, texts["B"], time.time()),
+        )
+        queue.db().commit()
+        restarted = app.EmbeddingRefreshQueue(path)
+        assert restarted.replay() == 1
+        assert restarted.drain(timeout=5)
+        assert user_embeddings[103] == [0.0, 1.0]
+        assert sorted(app.user_embedding_store.ids) == [101, 102, 103]
+    finally:
+        app.refresh_user_embeddings = original_refresh
+        app.EMBEDDINGS_DIR, app.user_embedding_store, state["dirty"] = saved
+        for user_id in (101, 102, 103):
+            user_embeddings.pop(user_id, None)
+    print("embedding refresh queue: OK")
+
+
+def write_tiny_checkpoint(model_dir, vocab, hidden=8, layers=2, heads=2):
+    """Write a random BERT checkpoint in safetensors format for the local backend."""
+    import json
+    import os
+    import struct
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    shapes = {
+        "embeddings.word_embeddings.weight": (len(vocab), hidden),
+        "embeddings.position_embeddings.weight": (32, hidden),
+        "embeddings.token_type_embeddings.weight": (2, hidden),
+        "embeddings.LayerNorm.weight": (hidden,),
+        "embeddings.LayerNorm.bias": (hidden,),
+    }
+    for i in range(layers):
+        prefix = f"encoder.layer.{i}"
+        for name in ["attention.self.query", "attention.self.key", "attention.self.value",
+                     "attention.output.dense"]:
+            shapes[f"{prefix}.{name}.weight"] = (hidden, hidden)
+            shapes[f"{prefix}.{name}.bias"] = (hidden,)
+        shapes[f"{prefix}.intermediate.dense.weight"] = (hidden * 4, hidden)
+        shapes[f"{prefix}.intermediate.dense.bias"] = (hidden * 4,)
+        shapes[f"{prefix}.output.dense.weight"] = (hidden, hidden * 4)
+        shapes[f"{prefix}.output.dense.bias"] = (hidden,)
+        for name in ["attention.output.LayerNorm", "output.LayerNorm"]:
+            shapes[f"{prefix}.{name}.weight"] = (hidden,)
+            shapes[f"{prefix}.{name}.bias"] = (hidden,)
+
+    header = {}
+    blobs = []
+    offset = 0
+    for name, shape in shapes.items():
+        data = rng.normal(scale=0.2, size=shape).astype(np.float32).tobytes()
+        header[name] = {"dtype": "F32", "shape": list(shape), "data_offsets": [offset, offset + len(data)]}
+        blobs.append(data)
+        offset += len(data)
+    header_bytes = json.dumps(header).encode("utf-8")
+    with open(os.path.join(model_dir, "model.safetensors"), "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)) + header_bytes + b"".join(blobs))
+    with open(os.path.join(model_dir, "vocab.txt"), "w") as f:
+        f.write("\n".join(vocab) + "\n")
+    with open(os.path.join(model_dir, "config.json"), "w") as f:
+        json.dump({"num_attention_heads": heads, "num_hidden_layers": layers,
+                   "max_position_embeddings": 32}, f)
+
+
+def test_local_encoder():
+    print("Testing local embedding backend...")
+    print("=" * 50)
+    import tempfile
+    import numpy as np
+
+    model_dir = tempfile.mkdtemp()
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "i", "feel", "lone", "##ly", "at", "asu", "."]
+    write_tiny_checkpoint(model_dir, vocab)
+    encoder = LocalMiniLMEncoder(model_dir)
+
+    assert encoder.tokenizer.encode("I feel lonely at ASU.") == [2, 4, 5, 6, 7, 8, 9, 10, 3]
+
+    texts = ["I feel lonely at ASU.", "lonely"]
+    batched = encoder.encode(texts)
+    single = np.vstack([encoder.encode([t]) for t in texts])
+    print(f"Embedding shape: {batched.shape}")
+    # Padding in a batch must not change any sentence's embedding
+    assert np.allclose(batched, single, atol=1e-5)
+    assert np.allclose(np.linalg.norm(batched, axis=1), 1.0, atol=1e-5)
+    print("local encoder: OK")
+
+
 if __name__ == "__main__":
     test_semantic_functions()
+    test_embedding_store()
+    test_ivf_index()
+    test_embedding_store_concurrency()
+    test_embedding_cache()
+    test_embedding_persistence()
+    test_embedding_flush()
+    test_embedding_refresh_queue()
+    test_local_encoder()